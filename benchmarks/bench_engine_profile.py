@@ -0,0 +1,81 @@
+"""
+Benchmark the SQLite engine profile (`src.db.PROFILE`) against the SQLite defaults.
+
+Writes `n` synthetic rows into TData in transactions of `batch` rows (as an ingest of
+many files does), then times a full read, the filtered reads of the analysis and the
+monthly aggregation (best of 3). Each profile uses its own temporary DB. Run from the
+top directory:
+    python -m benchmarks.bench_engine_profile [n_rows] [batch]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func
+
+from src.db import make_engine, PROFILE
+from src.tables import Base, TData
+
+READS = {
+    'full': select(TData),
+    'not excluded': select(TData).where(TData.category != 'Exclude'),
+    'sub_category': select(TData).where(TData.sub_category == 'sub 7'),
+    'monthly': select(func.strftime('%Y-%m', TData.date), TData.category,
+                      TData.sub_category, func.sum(TData.amount), func.count())
+    .group_by(func.strftime('%Y-%m', TData.date), TData.category, TData.sub_category),
+}
+
+
+def rows(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    cats = np.array(['Exclude'] + [f'cat {i}' for i in range(19)])
+    df = pd.DataFrame({
+        'date': pd.Timestamp('2015-01-01') + pd.to_timedelta(np.arange(n) // 30, 'D'),
+        'title': [f'title {i}' for i in range(n)],
+        'vendor': [f'vendor {i % 500}' for i in range(n)],
+        'amount': rng.uniform(-300, 0, n).round(2),
+        'balance': np.arange(n, dtype=float),
+        'category': cats[np.arange(n) % 20],
+        'sub_category': [f'sub {i % 200}' for i in range(n)]})
+    df['execution_date'] = df.date
+    return df
+
+
+def timed(f, *args) -> float:
+    t = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - t
+
+
+def run_profile(path: Path, df: pd.DataFrame, batch: int, profile: dict = None) -> dict:
+    engine = make_engine(f'sqlite:///{path}', profile)
+    Base.metadata.create_all(engine)
+    t = time.perf_counter()
+    for i in range(0, len(df), batch):
+        with engine.begin() as con:
+            df.iloc[i:i + batch].to_sql(TData.__tablename__, con, if_exists='append',
+                                        index=False)
+    res = {'write': len(df) / (time.perf_counter() - t)}
+    for name, q in READS.items():
+        with engine.connect() as con:
+            res[name] = len(df) / min(timed(pd.read_sql, q, con) for _ in range(3))
+    engine.dispose()
+    return res
+
+
+def run(n: int = 200_000, batch: int = 1_000):
+    df = rows(n)
+    with tempfile.TemporaryDirectory() as d:
+        res = {name: run_profile(Path(d) / f'{name}.db', df, batch, profile)
+               for name, profile in [('default', None), ('profile', PROFILE)]}
+    res = pd.DataFrame(res)
+    res['speedup'] = res.profile / res.default
+    print(f'throughput [rows/s] for {n} rows (writes in batches of {batch}):')
+    print(res.to_string(float_format=lambda x: f'{x:,.2f}' if x < 100 else f'{x:,.0f}'))
+
+
+if __name__ == '__main__':
+    run(*map(int, sys.argv[1:]))
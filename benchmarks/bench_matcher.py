@@ -0,0 +1,73 @@
+"""
+Benchmark the tag matcher against the former loop over the tag groups.
+
+The loop runs one `str.contains` per (category, sub_category, tag_type) group over the
+whole column, `TagMatcher` scans every distinct value once per tag type. Both are run
+on the rows and tags of benchmarks.synthetic, where titles are nearly all distinct, and
+must give the same categories. Run from the top directory:
+    python -m benchmarks.bench_matcher [--rows 50000] [--tags 10 300 1000]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import Synthetic
+from src.categories import Categories
+from src.matcher import TagMatcher
+
+
+def loop_match(df: pd.DataFrame, tags: pd.Series) -> pd.DataFrame:
+    """ The former matching: one regex per group over the column, the last match wins."""
+    res = pd.DataFrame({'category': None, 'sub_category': None, 'n_matches': 0},
+                       index=df.index)
+    for (cat, sub_cat, tag_type), group in tags.items():
+        pattern = '|'.join(group)
+        mask = df[tag_type].str.lower().str.contains(pattern, na=False, regex=True)
+        res.loc[mask, 'n_matches'] += 1
+        res.loc[mask, ['category', 'sub_category']] = [cat, sub_cat]
+    return res
+
+
+def case(n_rows: int, n_tags: int) -> dict:
+    syn = Synthetic(n_rows, n_tags)
+    df = syn.rows(0, n_rows).replace('', np.nan)
+    with tempfile.TemporaryDirectory() as d:
+        fname = Path(d) / 'categories.json'
+        fname.write_text(pd.Series(syn.categories()).to_json())
+        Categories.FNAME = fname
+        tags = Categories(update=False).agg_lists(Categories.file_tags())
+    res = {'rows': n_rows, 'tags': n_tags}
+    t = time.perf_counter()
+    old = loop_match(df, tags)
+    res['loop_s'] = time.perf_counter() - t
+    t = time.perf_counter()
+    matcher = TagMatcher(tags)
+    res['build_s'] = time.perf_counter() - t
+    for col in ['title', 'vendor', 'account']:  # title: nearly all values distinct
+        t = time.perf_counter()
+        matcher.scan(df[col], col)
+        res[f'{col}_s'] = time.perf_counter() - t
+    t = time.perf_counter()
+    new = matcher.match(df)
+    res['match_s'] = time.perf_counter() - t
+    old, new = (x.astype(object).where(x.notna(), None) for x in (old, new))
+    pd.testing.assert_frame_equal(old, new, check_dtype=False)
+    res['speedup'] = res['loop_s'] / (res['build_s'] + res['match_s'])
+    return res
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--rows', type=int, default=50_000)
+    p.add_argument('--tags', type=int, nargs='+', default=[10, 300, 1000])
+    a = p.parse_args()
+    df = pd.DataFrame([case(a.rows, n) for n in a.tags])
+    print(df.to_string(index=False, float_format='{:,.3f}'.format))
+
+
+if __name__ == '__main__':
+    main()
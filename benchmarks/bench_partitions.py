@@ -0,0 +1,89 @@
+"""
+Benchmark the day-to-day update with a long history, with and without closed years.
+
+Ingests a synthetic history (see benchmarks.synthetic) ending in the last full year,
+optionally closes all years before it (`Data.close_years`) and then times the update
+for a new export of a few rows of the open year, as it happens every day. Every case
+runs in a fresh interpreter with its own data directory, DB and cache. Run from the
+top directory:
+    python -m benchmarks.bench_partitions [--years 1 15] [--rows 20000] [--new 100]
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+LAST = date.today().year - 1  # the open year of the history
+REPEAT = 3
+
+
+def worker(d: Path, years: int, rows_per_year: int, n_new: int, close: int):
+    import benchmarks.synthetic as synthetic
+    import src.db
+    from src.categories import Categories
+    from src.data import Data
+    from src.db import get_session
+    from src.snapshot import Snapshot
+    from src.tables import TMeta
+
+    synthetic.START, synthetic.YEARS = pd.Timestamp(LAST - years + 1, 1, 1), years
+    source = synthetic.generate(d / 'source', years * rows_per_year, n_files=1)
+    data_dir = d / 'data'
+    shutil.copytree(source, data_dir)
+    src.db.DATABASE_URL = f'sqlite:///{d / "bench.db"}'
+    Snapshot.DIR = d / '.cache' / 'snapshot'
+    Data.DIR, Categories.FNAME = data_dir, data_dir / 'categories.json'
+
+    with get_session() as s:
+        TMeta.write(s, {})
+    data = Data(columns=[])
+    if close:
+        data.close_years(LAST - 1)
+    header, *lines = (data_dir / 'hist0.csv').read_text().splitlines()
+    times = []
+    for i in range(REPEAT):  # new card payments with the dates of the last rows
+        new = [line.replace('KARTY ', f'KARTY N{i}', 1) for line in lines[-n_new:]]
+        (data_dir / 'hist_new.csv').write_text('\n'.join([header, *new]) + '\n')
+        t = time.perf_counter()
+        Data(columns=[])
+        times.append(time.perf_counter() - t)
+    (d / 'result.json').write_text(json.dumps(min(times)))
+
+
+def run_case(years: int, rows_per_year: int, n_new: int, close: bool) -> float:
+    with tempfile.TemporaryDirectory() as d:
+        args = map(str, [d, years, rows_per_year, n_new, int(close)])
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_partitions', '--worker',
+                        *args], check=True, capture_output=True)
+        return json.loads((Path(d) / 'result.json').read_text())
+
+
+def run(years: list[int], rows_per_year: int = 20_000, n_new: int = 100):
+    for n in years:
+        for close in ([False, True] if n > 1 else [False]):
+            t = run_case(n, rows_per_year, n_new, close)
+            label = f'{n} years' + (' (closed)' if close else '')
+            print(f'{label:>18}: {n * rows_per_year:>9,} rows, update in {t:6.3f} s')
+
+
+def main():
+    if sys.argv[1:2] == ['--worker']:
+        d, *args = sys.argv[2:]
+        return worker(Path(d), *map(int, args))
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--years', type=int, nargs='+', default=[1, 15])
+    p.add_argument('--rows', type=int, default=20_000, help='rows per year')
+    p.add_argument('--new', type=int, default=100, help='rows of the new export')
+    args = p.parse_args()
+    run(args.years, args.rows, args.new)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark the cold start: import time of `src.analyse` (as `python -X importtime`) and
+the time from interpreter start to the first `Analysis.categorise`. Each measurement
+runs in a fresh interpreter, the best of `n` runs is compared with the budget in
+startup_budget.json. Run from the top directory (uses its DB and data):
+    python -m benchmarks.bench_startup [n]
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BUDGET = Path(__file__).with_name('startup_budget.json')
+
+FIRST_CATEGORISE = '''
+import time
+t = time.perf_counter()
+from src.analyse import Analysis
+Analysis().categorise()
+print(time.perf_counter() - t)
+'''
+
+
+def import_time(module='src.analyse') -> float:
+    """ :returns: cumulative import time [s] of `module` reported by -X importtime """
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                         capture_output=True, text=True, check=True)
+    for line in res.stderr.splitlines():
+        _, cum, name = line.split('|')
+        if name.strip() == module:
+            return int(cum) / 1e6
+    raise ValueError(f'no import time found for {module}')
+
+
+def first_categorise() -> float:
+    res = subprocess.run([sys.executable, '-c', FIRST_CATEGORISE], capture_output=True,
+                         text=True, check=True)
+    return float(res.stdout.splitlines()[-1])
+
+
+def run(n: int = 5) -> bool:
+    budget = json.loads(BUDGET.read_text())
+    results = {'import_s': min(import_time() for _ in range(n)),
+               'first_categorise_s': min(first_categorise() for _ in range(n))}
+    ok = True
+    for key, t in results.items():
+        within = t <= budget[key]
+        ok &= within
+        print(f'{key:>20}: {t:6.3f} s (budget {budget[key]:.3f} s) '
+              f'{"ok" if within else "OVER BUDGET"}')
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run(*map(int, sys.argv[1:])) else 1)
@@ -0,0 +1,146 @@
+"""
+Benchmark suite on synthetic data (see benchmarks.synthetic).
+
+Times update_history, match_categories, update_categories, the construction of
+Analysis, the first Analysis.categorise and the rendering of show_subcats for every
+combination of rows and tags, with rows/s and the peak memory (max RSS) of the process
+after each stage. Every scale runs in a fresh interpreter with its own data directory,
+DB and cache. The results are saved as JSON (default benchmarks/results/<commit>.json)
+and can be compared with those of an earlier commit. Run from the top directory:
+    python -m benchmarks.bench_suite [--rows 10000 100000] [--tags 100] [--files 4]
+                                     [--out FILE] [--compare FILE]
+Scales from 10k to 10M rows and 10 to 5,000 tags are supported.
+"""
+import argparse
+import json
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.synthetic import generate
+
+RESULTS = Path(__file__).with_name('results')
+
+
+def peak_rss() -> float:
+    """ :returns: peak resident memory of the process [MB] (ru_maxrss is in KiB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def stage(res: list, name: str, n: int):
+    t = time.perf_counter()
+    yield
+    t = time.perf_counter() - t
+    res.append({'stage': name, 'seconds': t, 'rows_per_s': n / t,
+                'peak_rss_mb': peak_rss()})
+
+
+def worker(d: Path, n_rows: int, n_tags: int, n_files: int):
+    """ Run all stages on a synthetic data set in `d` and save them to d/result.json."""
+    import src.db
+    from src.analyse import Analysis
+    from src.categories import Categories
+    from src.data import Data
+    from src.db import get_session
+    from src.snapshot import Snapshot
+    from src.tables import TMeta
+
+    source, data_dir = generate(d / 'source', n_rows, n_tags, n_files), d / 'data'
+    data_dir.mkdir()
+    for name in ['categories.json', 'allowed_duplicates.json']:
+        shutil.copy(source / name, data_dir)
+    # keep the DB, the caches and the data of the repo untouched
+    src.db.DATABASE_URL = f'sqlite:///{d / "bench.db"}'
+    Snapshot.DIR = d / '.cache' / 'snapshot'
+    Data.DIR, Categories.FNAME = data_dir, data_dir / 'categories.json'
+
+    with get_session() as s:
+        TMeta.write(s, {})  # tag types of a new DB
+    data = Data(columns=[])  # empty DB with the categories
+    for f in source.glob('hist*.csv'):
+        shutil.move(f, data_dir)
+    res = []
+    with stage(res, 'update_history', n_rows), get_session() as s:
+        data.update_history(s)
+    with stage(res, 'match_categories', n_rows):
+        data.match_categories(overwrite=True)
+    with stage(res, 'update_categories', n_rows), get_session() as s:
+        data.update_categories(s, force=True)
+    with stage(res, 'Analysis()', n_rows):
+        analysis = Analysis()
+    with stage(res, 'categorise', n_rows):
+        analysis.categorise(show_sub_cat=True, show_month=True)
+    with stage(res, 'show_subcats', n_rows):
+        analysis.show_subcats(bkg=True).to_html()
+    (d / 'result.json').write_text(json.dumps(res))
+
+
+def run_scale(n_rows: int, n_tags: int, n_files: int) -> list[dict]:
+    with tempfile.TemporaryDirectory() as d:
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_suite', '--worker', d,
+                        str(n_rows), str(n_tags), str(n_files)],
+                       check=True, stdout=subprocess.DEVNULL)
+        res = json.loads((Path(d) / 'result.json').read_text())
+    return [{'rows': n_rows, 'tags': n_tags, **r} for r in res]
+
+
+def commit() -> str:
+    try:
+        res = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                             text=True, check=True)
+        return res.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(old: dict, new: dict) -> pd.DataFrame:
+    """ :returns: seconds of both results and the speedup per scale and stage"""
+    key = ['rows', 'tags', 'stage']
+    df = pd.DataFrame(old['results']).merge(pd.DataFrame(new['results']), on=key,
+                                            suffixes=('_old', '_new'))
+    df['speedup'] = df.seconds_old / df.seconds_new
+    return df[key + ['seconds_old', 'seconds_new', 'speedup']]
+
+
+def run(rows: list[int], tags: list[int], n_files=4, out: Path = None,
+        old: Path = None) -> dict:
+    res = {'commit': commit(), 'date': datetime.now().isoformat(timespec='seconds'),
+           'python': sys.version.split()[0], 'pandas': pd.__version__,
+           'results': [r for n in rows for k in tags for r in run_scale(n, k, n_files)]}
+    out = out or RESULTS / f'{res["commit"]}.json'
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(res, indent=2))
+    fmt = '{:,.2f}'.format
+    print(pd.DataFrame(res['results']).to_string(index=False, float_format=fmt))
+    print(f'saved results to {out}')
+    if old is not None:
+        print(compare(json.loads(old.read_text()), res).to_string(index=False,
+                                                                  float_format=fmt))
+    return res
+
+
+def main():
+    if sys.argv[1:2] == ['--worker']:
+        d, *args = sys.argv[2:]
+        return worker(Path(d), *map(int, args))
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    p.add_argument('--tags', type=int, nargs='+', default=[100])
+    p.add_argument('--files', type=int, default=4, help='number of exports per scale')
+    p.add_argument('--out', type=Path, help='JSON file for the results')
+    p.add_argument('--compare', type=Path, help='JSON results of an earlier run')
+    a = p.parse_args()
+    run(a.rows, a.tags, a.files, a.out, a.compare)
+
+
+if __name__ == '__main__':
+    main()
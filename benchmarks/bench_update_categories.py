@@ -0,0 +1,66 @@
+"""
+Benchmark the category write-back of `Data.update_categories`.
+
+Compares the former one UPDATE per row with `Data.write_categories` on a temporary
+SQLite DB. Run from the top directory:
+    python -m benchmarks.bench_update_categories [n_rows]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.data import Data
+from src.tables import Base, TData
+
+
+def make_db(path: Path, n: int):
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'date': pd.Timestamp('2015-01-01') + pd.to_timedelta(np.arange(n) // 30, 'D'),
+        'title': [f'title {i}' for i in range(n)],
+        'amount': rng.uniform(-300, 0, n).round(2),
+        'balance': np.arange(n, dtype=float)})
+    df['execution_date'] = df.date
+    df.to_sql(TData.__tablename__, engine, if_exists='append', index=False)
+    return engine
+
+
+def updates(n: int) -> pd.DataFrame:
+    cats = np.array([f'cat {i}' for i in range(20)])
+    df = pd.DataFrame({'category': cats[np.arange(n) % 20],
+                       'sub_category': [f'sub {i % 200}' for i in range(n)]})
+    return df.set_axis(pd.RangeIndex(1, n + 1, name='id'))
+
+
+def per_row(s: Session, df: pd.DataFrame):
+    for idx, row in df.iterrows():
+        s.query(TData).filter(TData.id == idx).update({
+            TData.category: row.category,
+            TData.sub_category: row.sub_category},
+            synchronize_session=False)
+
+
+def run(n: int = 100_000):
+    df = updates(n)
+    with tempfile.TemporaryDirectory() as d:
+        for name, f in [('per-row', per_row), ('bulk', Data.write_categories)]:
+            engine = make_db(Path(d) / f'{name}.db', n)
+            with Session(engine) as s:
+                t = time.perf_counter()
+                f(s, df)
+                s.commit()
+                t = time.perf_counter() - t
+            print(f'{name:>8}: {n} rows in {t:6.2f} s -> {n / t:10,.0f} rows/s')
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    run(*map(int, sys.argv[1:]))
@@ -0,0 +1,142 @@
+"""
+Generate a synthetic data directory: bank exports `hist*.csv` in the format of
+`Data.read_csv` (Polish dates and decimals, 7 columns plus two empty ones),
+`categories.json` and `allowed_duplicates.json`.
+
+Vendors are drawn from a Zipf-like distribution, so most rows belong to a few tagged
+vendors, while titles carry random references (high cardinality). 70 % of the tags are
+vendor, 20 % title and 10 % account tags; a quarter of the title keywords and accounts
+is untagged. Consecutive exports overlap by 2 %. Run from the top directory:
+    python -m benchmarks.synthetic <out_dir> [n_rows] [n_tags] [n_files]
+"""
+import csv
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+HEADER = ['Data', 'Data wyk', 'Tytul', 'Kontrahent', 'Konto', 'Kwota', 'Saldo', '', '']
+VENDORS = ['LIDL', 'BIEDRONKA', 'ZABKA', 'ORLEN', 'BOLT', 'ROSSMANN', 'APTEKA', 'IKEA',
+           'CASTORAMA', 'EMPIK', 'PKP', 'ALLEGRO', 'MEDIA MARKT', 'CINEMA CITY', 'SHELL']
+START, YEARS = pd.Timestamp('2015-01-01'), 10
+
+
+class Synthetic:
+    """ Tags and rows of a synthetic data set with `n_rows` rows and `n_tags` tags."""
+
+    def __init__(self, n_rows: int = 10_000, n_tags: int = 100, seed: int = 0):
+        self.n_rows, self.n_tags = n_rows, n_tags
+        self.rng = np.random.default_rng(seed)
+        self.n_vendor = max(1, round(0.7 * n_tags))
+        self.n_title = max(1, round(0.2 * n_tags))
+        self.n_account = max(1, n_tags - self.n_vendor - self.n_title)
+        self.n_vendors = 2 * self.n_vendor  # half of the vendors are not tagged
+        p = 1 / np.arange(1, self.n_vendors + 1)
+        self.p_vendor = p / p.sum()
+
+    # --------------------------------------------
+    # region NAMES
+    @staticmethod
+    def vendor(i):
+        return f'{VENDORS[i % len(VENDORS)]} {i:05d}'
+
+    @staticmethod
+    def keyword(i):
+        return f'umowa {i:05d}'
+
+    @staticmethod
+    def account(i):
+        return f'11 2222 3333 {i:05d}'
+    # endregion
+    # --------------------------------------------
+
+    def categories(self) -> dict:
+        """ :returns: {category: {sub_category: {tag_type: [tags]}}}, 4 tags per
+        sub-category and 5 sub-categories per category; the first sub-category is
+        excluded."""
+        tags = [('vendor', self.vendor(i).lower()) for i in range(self.n_vendor)]
+        tags += [('title', self.keyword(i)) for i in range(self.n_title)]
+        tags += [('account', self.account(i)) for i in range(self.n_account)]
+        n_sub = max(1, self.n_tags // 4)
+        n_cat = max(1, n_sub // 5)
+        cats = {}
+        for k, (tag_type, tag) in enumerate(self.rng.permutation(np.array(tags, object))):
+            j = k % n_sub
+            cat = 'Exclude' if j == 0 and n_sub > 1 else f'Category {j % n_cat:03d}'
+            sub = cats.setdefault(cat, {}).setdefault(f'Sub {j:04d}', {})
+            sub.setdefault(tag_type, []).append(tag)
+        return cats
+
+    def allowed_duplicates(self) -> dict:
+        return {'vendor': [self.vendor(i).lower() for i in range(0, self.n_vendor, 50)]}
+
+    def rows(self, i0: int, i1: int, balance: int = 0) -> pd.DataFrame:
+        """ Rows i0 to i1 (sorted by date) with a running balance in grosz."""
+        n, rng = i1 - i0, self.rng
+        days = (np.arange(i0, i1) * (365 * YEARS) // self.n_rows).astype('timedelta64[D]')
+        date = START + pd.to_timedelta(days)
+        vendor = rng.choice(self.n_vendors, n, p=self.p_vendor)
+        transfer = rng.random(n) < 0.1
+        ref = pd.Series(rng.integers(0, 10 ** 9, n)).astype(str).str.zfill(9)
+        title = ('ZAKUP PRZY UZYCIU KARTY ' + ref).to_numpy(object)
+        kw = rng.integers(0, int(1.25 * self.n_title) + 1, n)
+        title[transfer] = [f'PRZELEW {self.keyword(k).upper()}' for k in kw[transfer]]
+        acc = rng.integers(0, int(1.25 * self.n_account) + 1, n)
+        account = np.where(transfer, [self.account(k) for k in acc], '')
+        amount = -np.round(rng.lognormal(3.5, 1, n) * 100).astype('i8')
+        amount[transfer] = rng.integers(-300_000, 400_000, transfer.sum())  # ~ balanced
+        return pd.DataFrame({
+            'date': date,
+            'execution_date': date + pd.to_timedelta(rng.integers(0, 3, n), 'D'),
+            'title': title,
+            'vendor': np.where(transfer, '', [self.vendor(v) for v in vendor]),
+            'account': account,
+            'amount': amount,
+            'balance': balance + np.cumsum(amount)})
+
+    @staticmethod
+    def money(x: pd.Series) -> pd.Series:
+        """ Format amounts in grosz as Polish decimals, e.g. -1234 -> '-12,34'."""
+        a = x.abs()
+        return (np.where(x < 0, '-', '') + (a // 100).astype(str) + ','
+                + (a % 100).astype(str).str.zfill(2))
+
+    @staticmethod
+    def day(x: pd.Series) -> pd.Series:
+        """ Format dates as dd-mm-YYYY, each distinct date only once."""
+        codes, uniques = pd.factorize(x)
+        return pd.Series(uniques.strftime('%d-%m-%Y').to_numpy(object)[codes], x.index)
+
+    @staticmethod
+    def to_csv(df: pd.DataFrame, fname: Path):
+        dates, money = ['date', 'execution_date'], ['amount', 'balance']
+        df = df.assign(**{c: Synthetic.day(df[c]) for c in dates},
+                       **{c: Synthetic.money(df[c]) for c in money}, e1=None, e2=None)
+        df.to_csv(fname, header=HEADER, index=False, quoting=csv.QUOTE_NONNUMERIC)
+
+    def write(self, out: Path, n_files: int = 4, overlap: float = .02):
+        """ Write the exports and the json files into `out`."""
+        out.mkdir(parents=True, exist_ok=True)
+        (out / 'categories.json').write_text(json.dumps(self.categories(), indent=2))
+        dup = json.dumps(self.allowed_duplicates())
+        (out / 'allowed_duplicates.json').write_text(dup)
+        bounds = np.linspace(0, self.n_rows, n_files + 1).astype(int)
+        balance, tail = 1_000_000, None
+        for j, (i0, i1) in enumerate(zip(bounds[:-1], bounds[1:])):
+            df = self.rows(i0, i1, balance)
+            balance = df.balance.iat[-1] if len(df) else balance
+            fname = out / f'hist{j}.csv'
+            self.to_csv(df if tail is None else pd.concat([tail, df]), fname)
+            tail = df.iloc[len(df) - int(overlap * len(df)):]
+
+
+def generate(out: Path, n_rows: int = 10_000, n_tags: int = 100, n_files: int = 4,
+             seed: int = 0) -> Path:
+    Synthetic(n_rows, n_tags, seed).write(Path(out), n_files)
+    return Path(out)
+
+
+if __name__ == '__main__':
+    generate(Path(sys.argv[1]), *map(int, sys.argv[2:]))
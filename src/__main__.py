@@ -0,0 +1,124 @@
+"""
+Command line interface for batch runs without a notebook (e.g. from cron):
+    python -m src ingest [--force] [--jobs N] [--chunksize N]
+    python -m src recategorise [--all]
+    python -m src report [--month] [--sub-cat] [--start DATE] [--end DATE] [--bkg]
+                         [-o FILE.csv|FILE.html]
+    python -m src stats
+`--profile` (before the command) prints the duration of every stage.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from src import perf
+
+REPORT_FORMATS = ['.csv', '.html']
+
+
+def ingest(args):
+    """ Ingest new or changed exports, categorise new rows and update the snapshot."""
+    from src.data import Data
+    Data(columns=[], force_update=args.force, chunksize=args.chunksize, jobs=args.jobs)
+
+
+def recategorise(args):
+    """ Sync the categories file and recategorise the affected (or all) rows."""
+    from src.categories import Categories
+    from src.data import Data
+    data = Data(columns=[], update=False)
+    data.cat = Categories()
+    data.update_(force=args.all, history=False)
+
+
+def report(args):
+    """ Print or export the yearly or monthly expenses per category or sub-category."""
+    from src.analyse import Analysis
+    analysis = Analysis(update=False, start=args.start, end=args.end)
+    show = analysis.show_subcats if args.sub_cat else analysis.show_categories
+    dfs = show(show_month=args.month, bkg=args.bkg)
+    if args.output is None:
+        with pd.option_context('display.max_rows', None, 'display.max_columns', None,
+                               'display.width', None):
+            print(dfs.data.round(0).to_string(na_rep=''))
+        return
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    if args.output.suffix == '.csv':
+        dfs.data.round(2).to_csv(args.output)  # money in grosz
+    else:
+        args.output.write_text(dfs.to_html())
+    print(f'wrote report to {args.output}')
+
+
+def stats(_):
+    """ Print the number and range of the rows and the sizes of the tables."""
+    from src.data import Data
+    from src.db import list_table_sizes
+    data = Data(columns=['date', 'category'], update=False)
+    print(f'rows:           {len(data)}')
+    if len(data):
+        print(f'dates:          {data.min_date:%Y-%m-%d} - {data.max_date:%Y-%m-%d}')
+    print(f'uncategorised:  {len(data.groups.select(category=None))}')
+    print(f'excluded:       {data.n_excluded}')
+    print(list_table_sizes().to_string())
+
+
+def report_file(fname: str) -> Path:
+    if Path(fname).suffix not in REPORT_FORMATS:
+        raise argparse.ArgumentTypeError(f'{fname} is not one of {REPORT_FORMATS}')
+    return Path(fname)
+
+
+def print_profile():
+    if perf.LAST is None:
+        return
+    df = pd.DataFrame(perf.LAST['spans']).set_index('name')
+    print(f'\n{perf.LAST["run"]}: {perf.LAST["seconds"]:.3f} s')
+    rows = {'rows': lambda n: '' if pd.isna(n) else f'{n:,.0f}'}
+    print(df.to_string(na_rep='', float_format='{:,.3f}'.format, formatters=rows))
+
+
+def parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog='python -m src', description=__doc__.split('\n')[1])
+    p.add_argument('--profile', action='store_true', help='print the stage timings')
+    sub = p.add_subparsers(dest='command', required=True)
+
+    s = sub.add_parser('ingest', help=ingest.__doc__)
+    s.add_argument('--force', action='store_true', help='re-read all files')
+    s.add_argument('--jobs', type=int, default=1, help='processes to parse the files')
+    s.add_argument('--chunksize', type=int, help='stream the files in chunks of rows')
+    s.set_defaults(func=ingest)
+
+    s = sub.add_parser('recategorise', help=recategorise.__doc__)
+    s.add_argument('--all', action='store_true', help='recategorise all rows')
+    s.set_defaults(func=recategorise)
+
+    s = sub.add_parser('report', help=report.__doc__)
+    s.add_argument('--month', action='store_true', help='monthly instead of yearly')
+    s.add_argument('--sub-cat', action='store_true', help='per sub-category')
+    s.add_argument('--start', help='first date (inclusive)')
+    s.add_argument('--end', help='last date (exclusive)')
+    s.add_argument('--bkg', action='store_true', help='background gradient (HTML)')
+    s.add_argument('-o', '--output', type=report_file, help='.csv or .html file')
+    s.set_defaults(func=report)
+
+    s = sub.add_parser('stats', help=stats.__doc__)
+    s.set_defaults(func=stats)
+    return p
+
+
+def main(argv: list[str] = None) -> int:
+    args = parser().parse_args(argv)
+    if args.profile:
+        perf.enable()
+    with perf.span(f'cli.{args.command}'):
+        args.func(args)
+    if args.profile:
+        print_profile()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,35 +1,106 @@
+import hashlib
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
-import plotly.express as px
+from src import plot
+from src.cube import Cube
 from src.data import Data
-from src.tables import TData
-from datetime import datetime
+from src.db import read_sql
+from src.page import Page
+from src.snapshot import Snapshot
+from src.tables import TData, TMonthly
+from sqlalchemy import select
 
 
 class Analysis:
 
-    def __init__(self, force_update=False):
-        self.data_ = Data(force_update=force_update)
+    COLS = ['date', *TData.TYPE_ORDER, 'amount', 'category', 'sub_category']
+
+    def __init__(self, force_update=False, chunksize: int = None, jobs=1, start=None,
+                 end=None, update=True):
+        # nothing is loaded here, the views load the columns they need
+        self.data_ = Data(force_update=force_update, chunksize=chunksize, jobs=jobs,
+                          columns=[], start=start, end=end, update=update)
         self.cat = self.data_.cat
 
-        self.date_cols = [self.data_.date.dt.year, self.data_.date.dt.month]
+        self.cube_, self.version_ = None, None
+        self.views_ = {}  # memoized results of categorise
+
+    def follow(self, watcher) -> 'Analysis':
+        """ Show the state of every ingest of the watcher (see Data.follow)."""
+        self.data_.follow(watcher)
+        return self
 
     @property
     def data(self):
-        return self.data_.query('category != "Exclude"')
+        df = self.data_.load(*self.COLS)
+        return df[df.category != 'Exclude']
+
+    @property
+    def monthly(self) -> pd.DataFrame:
+        """ Monthly sums per sub-category (without Exclude) of the rows with start <= date
+        < end: whole months from the summary table, the partial months at the bounds of
+        the range summed from TData."""
+        start, end = (None if x is None else pd.Timestamp(x)
+                      for x in (self.data_.start, self.data_.end))
+        # whole months are those from `first` until before `last`
+        first = None if start is None else start.to_period('M').start_time
+        if first is not None and first < start:
+            first = (start.to_period('M') + 1).start_time
+        last = None if end is None else end.to_period('M').start_time
+        if first is not None and last is not None and first >= last:
+            return self.partial_sums(start, end)
+        t = TMonthly
+        period = t.year * 100 + t.month
+        q = select(*t.columns_).where(t.category.is_distinct_from('Exclude'))
+        if first is not None:
+            q = q.where(period >= first.year * 100 + first.month)
+        if last is not None:
+            q = q.where(period < last.year * 100 + last.month)
+        dfs = [read_sql(q)]
+        if start is not None and start < first:
+            dfs.append(self.partial_sums(start, first))
+        if end is not None and last < end:
+            dfs.append(self.partial_sums(last, end))
+        return pd.concat(dfs, ignore_index=True) if len(dfs) > 1 else dfs[0]
+
+    @staticmethod
+    def partial_sums(start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """ Monthly sums per sub-category (without Exclude) of the rows with start <= date
+        < end, computed from TData."""
+        q = TMonthly.sums().where(TData.date >= start, TData.date < end,
+                                  TData.category.is_distinct_from('Exclude'))
+        return read_sql(q)
+
+    @property
+    def cube(self) -> Cube:
+        """ Cube of the monthly sums, rebuilt if the data has a new version."""
+        if self.version_ != self.data_.version:
+            self.cube_, self.version_ = Cube(self.monthly), self.data_.version
+            self.views_.clear()
+        return self.cube_
 
     def categorise(self, show_sub_cat=False, show_month=False):
-        cat_cols = self.cat.COLS if show_sub_cat else self.cat.COLS[:1]
-        date_cols = self.date_cols if show_month else self.date_cols[:1]
-        df = self.data.groupby(date_cols + cat_cols)['amount'].sum()
-        date_names = ['year'] + (['month'] if show_month else [])
-        df = df.unstack(cat_cols).sort_index(axis=1).rename_axis(date_names)
-        idx_tot = ('total', '') if show_month else 'total'
-        df.loc[idx_tot, :] = df.sum()
-        return df
-
-    def show_categories(self, show_month=False, bkg=False, axis=0):
+        cube, key = self.cube, (show_sub_cat, show_month)
+        if key not in self.views_:
+            df = cube.view(show_sub_cat, show_month)
+            idx_tot = ('total', '') if show_month else 'total'
+            df.loc[idx_tot, :] = df.sum()
+            self.views_[key] = df
+        return self.views_[key].copy()
+
+    def show_categories(self, show_month=False, bkg=False, axis=0, page: int = None,
+                        page_size: int = Page.SIZE):
+        """ :param page: render only this page of `page_size` rows (see Page) instead of
+                         styling the whole table """
         df = self.categorise(show_sub_cat=False, show_month=show_month)
         caption = f'{"Montly" if show_month else "Yearly"} Expenses'
+        if page is not None:
+            rows = np.arange(len(df)) < len(df) - 1  # without the total
+            subset = (rows, ~df.columns.str.contains('Income'))
+            return Page(df, caption, limit=page_size, bkg=bkg, subset=subset,
+                        axis=axis).page(page)
         dfs = df.style.format('{:,.0f}', na_rep='').set_caption(caption)
         if bkg:
             subset = pd.IndexSlice[df.index[:-1], ~df.columns.str.contains('Income')]
@@ -37,9 +108,16 @@ class Analysis:
                    .background_gradient(cmap='Blues_r', axis=axis, subset=subset))  # noqa
         return dfs
 
-    def show_subcats(self, show_month=False, bkg=False, axis=1):
+    def show_subcats(self, show_month=False, bkg=False, axis=1, page: int = None,
+                     page_size: int = Page.SIZE):
+        """ :param page: see show_categories """
         df = self.categorise(show_sub_cat=True, show_month=show_month).T
         caption = f'{"Montly" if show_month else "Yearly"} Expenses by Sub-category'
+        if page is not None:
+            rows = ~df.index.get_level_values(0).str.contains('Income')
+            subset = (rows, np.arange(df.shape[1]) < df.shape[1] - 1)
+            return Page(df, caption, limit=page_size, bkg=bkg, subset=subset,
+                        axis=axis).page(page)
         dfs = df.style.format('{:,.0f}', na_rep='').set_caption(caption)
         if bkg:
             idx = ~df.index.get_level_values(0).str.contains('Income')
@@ -49,43 +127,95 @@ class Analysis:
         return dfs
 
     def plot_category(self, cat=None, sub_cat=None, show_month=False):
-        df = self.categorise(show_sub_cat=sub_cat is not None, show_month=show_month)
+        return self.plot(None if cat is None else [cat],
+                         None if sub_cat is None else [sub_cat], show_month)
+
+    def plot(self, cats: list[str] = None, sub_cats: list[str] | bool = None,
+             show_month=False, html: Path = None):
+        """ Plot the yearly or monthly expenses of many categories or sub-categories at
+        once with WebGL traces.
+        :param cats: categories to plot (default: all)
+        :param sub_cats: sub-categories to plot instead, True for all (of `cats`)
+        :param html: write the figure to this static HTML file instead of returning it,
+                     which is only rendered again if the data or the arguments changed
+        """
+        key = ('plot', cats, sub_cats, show_month)
+        return self.render(key, html, lambda: self.plot_(cats, sub_cats, show_month))
+
+    def plot_(self, cats, sub_cats, show_month):
+        df = self.categorise(show_sub_cat=sub_cats is not None, show_month=show_month)
         df = df.abs().iloc[:-1]
-        if sub_cat is not None:
-            df = df.droplevel('category', axis=1)
-
-        if show_month:
-            x = df.index.map(lambda i: datetime(year=i[0], month=i[1], day=1))
-        else:
-            x = df.index
-        y = sub_cat or cat
-        title = f'{"Monthly" if show_month else "Yearly"} {y} Expenses'
-        fig = px.scatter(df, x=x, y=y or sub_cat, title=title)
-
-        # Update layout
-        time_period = "Monthly" if show_month else "Yearly"
-        fig.update_traces(mode='lines+markers', line=dict(width=2), marker=dict(size=8))
-        fig.update_layout(
-            xaxis_title="Date" if show_month else "Year",
-            yaxis_title="Amount [PLN]",
-            hovermode='x unified',
-            template='plotly_white'
-        )
-        return fig
+        if cats is not None:
+            df = df.loc[:, df.columns.get_level_values(0).isin(cats)]
+        if sub_cats is not None and sub_cats is not True:
+            df = df.loc[:, df.columns.get_level_values(-1).isin(sub_cats)]
+        x = plot.month_starts(df.index) if show_month else df.index
+        names, groups = df.columns.get_level_values(-1), df.columns.get_level_values(0)
+        traces = [dict(x=x, y=df.iloc[:, i].to_numpy(), name=name, legendgroup=group)
+                  for i, (name, group) in enumerate(zip(names, groups))]
+        y = f' {names[0]}' if len(names) == 1 else ''
+        title = f'{"Monthly" if show_month else "Yearly"}{y} Expenses'
+        return plot.figure(traces, title, 'Date' if show_month else 'Year')
+
+    def plot_daily(self, cats: list[str] = None, sub_cats: list[str] | bool = None,
+                   daily=True, max_points: int | None = 2000, html: Path = None):
+        """ Plot the expenses per day (or per transaction if not `daily`) with WebGL
+        traces, each series downsampled with LTTB to `max_points` (None: all points).
+        See `plot` for the other arguments."""
+        key = ('plot_daily', cats, sub_cats, daily, max_points)
+        return self.render(key, html, lambda: self.plot_daily_(cats, sub_cats, daily,
+                                                               max_points))
+
+    def plot_daily_(self, cats, sub_cats, daily, max_points):
+        df = self.data
+        cols = ['category'] if sub_cats is None else ['category', 'sub_category']
+        if cats is not None:
+            df = df[df.category.isin(cats)]
+        if sub_cats is not None and sub_cats is not True:
+            df = df[df.sub_category.isin(sub_cats)]
+        df = df.dropna(subset=cols)
+        if daily:
+            df = df.groupby([*cols, df.date.dt.floor('D')], observed=True).amount.sum()
+            df = df.reset_index()
+        traces = []
+        for key, g in df.sort_values('date', kind='stable').groupby(cols, observed=True):
+            x, y = g.date.to_numpy(), g.amount.abs().to_numpy()
+            idx = plot.lttb(x, y, max_points)
+            traces.append(dict(x=x[idx], y=y[idx], name=key[-1], legendgroup=key[0]))
+        title = f'{"Daily" if daily else "All"} Expenses'
+        return plot.figure(traces, title, 'Date', mode='lines')
+
+    def render(self, key: tuple, html: Path | None, make):
+        """ :returns: the figure of `make` or the HTML file it was written to"""
+        if html is None:
+            return make()
+        key = repr((*key, self.data_.start, self.data_.end, Snapshot.stamp()))
+        return plot.write_html(Path(html), hashlib.sha256(key.encode()).hexdigest(), make)
 
     @staticmethod
-    def format_cat(df: pd.DataFrame):
+    def format_cat(df: pd.DataFrame, page: int = None, page_size: int = Page.SIZE):
         cols = TData.TYPE_ORDER[::-1] + [df.date.dt.year, df.date.dt.month]
         df = df.set_index(cols)[['amount']]
         df.index.names = TData.TYPE_ORDER[::-1] + ['year', 'month']
         df = df.sort_index()
+        if page is not None:
+            return Page(df, fmt='{:,.0f} zł', limit=page_size).page(page)
         return df.style.format('{:,.0f} zł', na_rep='')
 
-    def show_subcat(self, name):
-        df = self.data.query(f'sub_category == "{name}"')
-        return self.format_cat(df).set_caption(f'Expenses in {name}')
+    def drill_down(self, page: int = None, page_size: int = Page.SIZE, **values):
+        """ Transactions with the given category, sub_category, vendor and/or account
+        (without Exclude), e.g. drill_down(category='Food', vendor='LIDL').
+        :param page: see show_categories """
+        df = self.data_.load(*self.COLS).rows(**values)
+        df = df[df.category != 'Exclude']
+        caption = f'Expenses in {", ".join(map(str, values.values()))}'
+        return self.format_cat(df, page, page_size).set_caption(caption)
+
+    def show_subcat(self, name, page: int = None, page_size: int = Page.SIZE):
+        return self.drill_down(page, page_size, sub_category=name)
 
-    def show_uncategorised(self, n=None):
-        df = self.data_.uncategorised.head(n)
-        return self.format_cat(df).set_caption('Uncategorised Expenses')
+    def show_uncategorised(self, n=None, page: int = None, page_size: int = Page.SIZE):
+        df = self.data_.load(*self.COLS).uncategorised.head(n)
+        caption = 'Uncategorised Expenses'
+        return self.format_cat(df, page, page_size).set_caption(caption)
 
@@ -1,10 +1,11 @@
 import json
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Type
+from typing import Type, NamedTuple
 import pandas as pd
-from src.db import get_session, read_table, read_sql, select
+from src.db import get_session, read_table, read_sql, select, Select
 from sqlalchemy.orm import Session
+from src.matcher import TagMatcher
 from src.utils import DATA_DIR
 from src.tables import TMeta, TCategory, MyBase, TFileHash, TSubCategory, TTag, TData
 
@@ -13,8 +14,9 @@ class _Base(ABC):
     FNAME: Path
     T: Type[MyBase]
 
-    def __init__(self):
-        self.was_updated = self.update()
+    def __init__(self, update=True):
+        """ :param update: sync the DB with the file if it changed """
+        self.was_updated = self.update() if update else False
 
     @property
     def table(self):
@@ -37,52 +39,101 @@ class _Base(ABC):
     def write_hash(cls, s: Session):
         TFileHash.write(s, cls.FNAME)
 
-    @classmethod
-    def update(cls, force=False) -> bool:
+    def update(self, force=False) -> bool:
         with get_session() as s:
-            if force or cls.has_update(s):
-                cls.write_hash(s)
-                return cls.write(s) > 0
+            if force or self.has_update(s):
+                self.write_hash(s)
+                return self.write(s) > 0
             return False
 
     @classmethod
     def read_json(cls):
         return json.loads(cls.FNAME.read_text())
 
-    @classmethod
     @abstractmethod
-    def write(cls, s: Session) -> int:
+    def write(self, s: Session) -> int:
         """ Insert the data of the main table into the DB"""
 
 
+class TagDelta(NamedTuple):
+    """ Tags (category, sub_category, tag_type, tag) added to or removed from the file."""
+    added: set
+    removed: set
+
+    @property
+    def tags(self) -> set:
+        return self.added | self.removed
+
+    @property
+    def sub_categories(self) -> set:
+        """ (category, sub_category) which lost tags."""
+        return {t[:2] for t in self.removed}
+
+
 class Categories(_Base):
     FNAME = DATA_DIR / 'categories.json'
     T = TTag
 
     COLS = ['category', 'sub_category']
+    IDX = COLS + ['tag_type']
+
+    def __init__(self, update=True):
+        self.delta = TagDelta(set(), set())
+        super().__init__(update)
+
+    @staticmethod
+    def select_view() -> Select:
+        return select(TCategory.name.label('category'),
+                      TSubCategory.name.label('sub_category'),
+                      TMeta.tag_type, TTag.value.label('tag')).select_from(TTag).join(
+            TSubCategory).join(TCategory).join(TMeta)
 
     @property
     def view(self):
-        s = select(TCategory.name.label('category'),
-                   TSubCategory.name.label('sub_category'),
-                   TMeta.tag_type, TTag.value.label('tag')).select_from(TTag).join(
-            TSubCategory).join(TCategory).join(TMeta)
-        df = read_sql(s)
-        return df.set_index(['category', 'sub_category', 'tag_type']).sort_index()
+        df = read_sql(self.select_view())
+        return df.set_index(self.IDX).sort_index()
     v = view
 
     @classmethod
-    def write(cls, s: Session) -> int:
-        data = cls.read_json()
-        n = TCategory.write(s, data)
-        n += TSubCategory.write(s, data)
-        return n + TTag.write(s, data)
-
-    def agg_lists(self) -> pd.Series:
-        df = self.v
+    def tags(cls, s: Session) -> set:
+        return set(s.execute(cls.select_view()).all())
+
+    def write(self, s: Session) -> int:
+        """ Sync the categories with the file and store which tags changed.
+        :returns: number of changed tags"""
+        data = self.read_json()
+        old = self.tags(s)
+        TCategory.write(s, data)
+        TSubCategory.write(s, data)
+        TTag.write(s, data)
+        s.flush()
+        new = self.tags(s)
+        self.delta = TagDelta(added=new - old, removed=old - new)
+        return len(self.delta.tags)
+
+    def agg_lists(self, tags: set = None) -> pd.Series:
+        """ Lists of all (or the given) tags per (category, sub_category, tag_type)."""
+        if tags is None:
+            df = self.v
+        else:
+            df = pd.DataFrame(sorted(tags), columns=self.IDX + ['tag'])
+            df = df.set_index(self.IDX)
         df = df.groupby(df.index.names)['tag'].agg(list)
         # sort by tag_type according to TData.TYPE_ORDER
         sort_indices = df.index.get_level_values(2).map(
             lambda x: TData.TYPE_ORDER.index(x)).argsort()
         return df.iloc[sort_indices]
 
+    @classmethod
+    def file_tags(cls) -> set:
+        """ Tags (category, sub_category, tag_type, tag) of the file, lower case as in
+        the DB."""
+        return {(cat, sc, tag_type, tag.lower()) for cat, subs in cls.read_json().items()
+                for sc, td in subs.items() for tag_type, tags in td.items()
+                for tag in tags}
+
+    @property
+    def matcher(self) -> TagMatcher:
+        """ Compiled tag matcher of the file, built once per version of the file."""
+        return TagMatcher.cached(TFileHash.compute(self.FNAME),
+                                 lambda: self.agg_lists(self.file_tags()))
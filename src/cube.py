@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+
+class Cube:
+    """ Dense (period x category x sub_category) arrays of the monthly sums and counts."""
+
+    COLS = ['category', 'sub_category']
+
+    def __init__(self, df: pd.DataFrame):
+        """ :param df: monthly sums with the columns year, month, category, sub_category,
+        amount and n (see TMonthly) """
+        df = df[df.category.notna()]
+        dates = pd.MultiIndex.from_frame(df[['year', 'month']])
+        self.periods = dates.unique().sort_values()
+        p = self.periods.get_indexer(dates)
+        c, self.cats = pd.factorize(df.category, sort=True)
+        s, self.subs = pd.factorize(df.sub_category, sort=True)  # NaN -> last slot (-1)
+        shape = (len(self.periods), len(self.cats), len(self.subs) + 1)
+        self.amount, self.n = np.zeros(shape), np.zeros(shape, 'i8')
+        np.add.at(self.amount, (p, c, s), df.amount.to_numpy(float))
+        np.add.at(self.n, (p, c, s), df.n.to_numpy('i8'))
+
+    def by_year(self, x: np.ndarray) -> np.ndarray:
+        years = self.periods.get_level_values('year')
+        if len(years) == 0:  # e.g. a range without transactions
+            return x
+        return np.add.reduceat(x, np.flatnonzero(np.r_[True, years[1:] != years[:-1]]))
+
+    def view(self, show_sub_cat=False, show_month=False) -> pd.DataFrame:
+        """ Sums per period (month or year) and category or (category, sub_category).
+        Groups without transactions in a period are NaN, as for a groupby + unstack."""
+        amount, n = self.amount, self.n
+        if show_month:
+            index = self.periods
+        else:
+            amount, n = self.by_year(amount), self.by_year(n)
+            index = self.periods.get_level_values('year').unique()
+        if show_sub_cat:  # rows without sub_category are dropped as in a groupby
+            size = len(self.cats) * len(self.subs)  # not -1, which fails without periods
+            amount, n = (x[..., :-1].reshape(len(index), size) for x in (amount, n))
+            keep = n.sum(0) > 0
+            columns = pd.MultiIndex.from_product([self.cats, self.subs], names=self.COLS)
+            amount, n, columns = amount[:, keep], n[:, keep], columns[keep]
+        else:
+            amount, n = amount.sum(2), n.sum(2)
+            columns = pd.Index(self.cats, name=self.COLS[0])
+        return pd.DataFrame(np.where(n > 0, amount, np.nan), index, columns)
@@ -1,32 +1,113 @@
 import json
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date, timedelta
+from importlib.util import find_spec
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
 
+import numpy as np
 import pandas as pd
+from sqlalchemy import (update, bindparam, select, insert, Table, MetaData, Column,
+                        func, literal_column, cast, Float)
 from sqlalchemy.orm import Session
 
 from src.categories import Categories
-from src.db import read_table, get_session
+from src.db import read_sql, read_sql_chunks, get_session
+from src.groups import GroupIndex
 from src.logger import setup_logger
-from src.tables import TFileHash, TData
+from src.matcher import TagMatcher
+from src.perf import timed, span
+from src.snapshot import Snapshot
+from src.tables import TFileHash, TData, TMonthly, TPartition
 from src.utils import DATA_DIR
 
+if TYPE_CHECKING:
+    from src.watcher import Watcher
+
+
+def text_dtype() -> pd.StringDtype | None:
+    """ Arrow-backed strings (with NaN as missing value) for free text if pyarrow is
+    installed, else None (object strings)."""
+    if find_spec('pyarrow') is None:
+        return None
+    try:
+        return pd.StringDtype('pyarrow', na_value=np.nan)
+    except TypeError:  # pandas < 2.3 has no na_value
+        pass
+    try:
+        return pd.StringDtype('pyarrow_numpy')
+    except ValueError:  # pandas < 2.1
+        return None
+
+
+TEXT_DTYPE = text_dtype()
+
 
 class Data(pd.DataFrame):
 
     T = TData
     DIR: Path = DATA_DIR
 
-    def __init__(self, data=None, force_update=False, **kwargs):
-        if data is None:
-            data = self.read_from_db()
+    KEY = ['date', 'title', 'amount', 'balance']  # columns of uix_date_tit_am_bal
+    COLS = [col for col in TData.column_names if col != 'id']
+    # in-memory layout
+    CATEGORICAL = ['vendor', 'account', 'category', 'sub_category']
+    MONEY = ['amount', 'balance']
+    TEXT = ['title']
+    BALANCE_BY = None  # column of the statements with separate running balances
+
+    def __init__(self, data=None, force_update=False, chunksize: int = None, jobs=1,
+                 columns: list[str] = None, start=None, end=None, update=True, **kwargs):
+        """
+        :param columns: columns to load from the DB (default: all), the others are loaded
+                        from the DB on first access
+        :param start: only load rows with a date >= start
+        :param end: only load rows with a date < end
+        :param update: ingest new files and categories, else only read the committed
+                       state (e.g. if a Watcher ingests in the background)
+        """
+        lazy = data is None
+        if lazy:
+            data = self.read(columns, start, end)
         super().__init__(data, **kwargs)
 
-        self.cat = Categories()
-        self.log = setup_logger(__name__)
-        self.update_(force_update)
+        self.lazy = lazy
+        self.start, self.end = start, end
+        self.chunksize = chunksize  # stream the csv files in chunks of this many rows
+        self.jobs = jobs  # number of processes to parse the csv files
+        self.version = 0  # incremented whenever rows are inserted or recategorised
+        self.groups_ = None
+        self.cat = Categories(update)
+        if update:
+            self.update_(force_update)
+
+    def __getattr__(self, name):
+        if name in Data.COLS:
+            self.load(name)
+        return super().__getattr__(name)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            self.load(key)
+        elif isinstance(key, list):
+            self.load(*key)
+        return super().__getitem__(key)
+
+    def load(self, *cols: str) -> 'Data':
+        """ Load the given columns from the DB if they are not loaded yet."""
+        cols = [c for c in cols if c in self.COLS and c not in self.columns]
+        if cols and getattr(self, 'lazy', False):
+            df = self.read(cols, self.start, self.end)
+            for col in cols:
+                self[col] = df[col].reindex(self.index)
+        return self
 
     # --------------------------------------------
     # region GETTERS
+    @property
+    def log(self):
+        return setup_logger(__name__)
+
     @property
     def fnames(self):
         return list(self.DIR.glob('hist*.csv'))
@@ -39,72 +120,316 @@ class Data(pd.DataFrame):
     def max_date(self):
         return self.date.max()
 
+    @property
+    def groups(self) -> GroupIndex:
+        """ Group index of the rows, rebuilt if the data has a new version."""
+        if self.groups_ is None or self.groups_.version != self.version:
+            self.groups_ = GroupIndex(self, self.version)
+        return self.groups_
+
+    def rows(self, **values) -> pd.DataFrame:
+        """ Rows with the given values of category, sub_category, vendor or account
+        (None selects missing values), looked up in the group index."""
+        return self.iloc[self.groups.select(**values)]
+
     @property
     def excluded(self):
-        return self[self.category == 'Exclude'].drop(columns=self.cat.COLS)
+        return self.rows(category='Exclude').drop(columns=self.cat.COLS)
 
     @property
     def n_excluded(self):
-        return (self.category == 'Exclude').sum()
+        return self.groups.select(category='Exclude').size
 
     @property
     def uncategorised(self):
-        return self[self.category.isna()].drop(columns=self.cat.COLS)
+        return self.rows(category=None).drop(columns=self.cat.COLS)
     # endregion GETTERS
     # --------------------------------------------
 
     # --------------------------------------------
     # region INIT & UPDATE
     def write(self, s: Session, df: pd.DataFrame):
-        n0, n1 = len(self), len(df)
-        self.log.info(f'inserted {n1} rows into {TData.name_} ({n0} -> {n0 + n1})')
-        df.to_sql(self.T.__tablename__, s.bind, if_exists='append', index=False)
+        n0, n_read = len(self), len(df)
+        df = self.open_rows(s, df)
+        n1 = self.insert_new(s, df)
+        self.log_insert(n0, n1, len(df) - n1, n_read - len(df))
+        if n1 > 0:
+            TMonthly.refresh(s, df.date.dt.to_period('M').unique())
         return n1
 
+    def log_insert(self, n0: int, n1: int, skipped: int, closed: int = 0):
+        self.log.info('inserted %d rows into %s (%d -> %d), skipped %d duplicates and '
+                      '%d rows of closed years', n1, TData.name_, n0, n0 + n1, skipped,
+                      closed)
+
+    def insert_new(self, s: Session, df: pd.DataFrame) -> int:
+        """ Insert the rows of `df` which are not yet in the DB. The rows are staged in a
+        temporary table and anti-joined with the unique key uix_date_tit_am_bal, so the
+        cost only depends on the number of rows in `df`.
+        :returns: number of inserted rows"""
+        t = self.T.__table__
+        staging = Table('staging', MetaData(), *[Column(c, t.c[c].type) for c in df],
+                        prefixes=['TEMPORARY'])
+        con = s.connection()
+        staging.create(con)
+        try:
+            if not df.empty:
+                df = df.astype(object).where(df.notna(), None)
+                con.execute(staging.insert(), df.to_dict('records'))
+            stored = select(t.c.id).where(*[t.c[c] == staging.c[c] for c in self.KEY])
+            # rows of the same date keep the order of `df` (rowid of the staging table)
+            order = [staging.c.date, literal_column(f'{staging.name}.rowid')]
+            q = select(staging).where(~stored.exists()).order_by(*order)
+            return con.execute(insert(t).from_select(list(df), q)).rowcount
+        finally:
+            staging.drop(con)
+
+    def open_rows(self, s: Session, df: pd.DataFrame) -> pd.DataFrame:
+        """ Drop the rows of closed years, which are read-only (they are counted in the
+        summary of `log_insert`)."""
+        start = TPartition.open_start(s)
+        return df if start is None else df[df.date >= start]
+
+    @staticmethod
+    def open_start() -> datetime | None:
+        with get_session() as s:
+            return TPartition.open_start(s)
+
+    @staticmethod
+    def select_rows(columns: list[str] = None, start=None, end=None, after: int = None):
+        """ Query of the given columns (default: all) of the rows with start <= date < end
+        (and id > after), ordered by id."""
+        cols = [getattr(TData, c) for c in (Data.COLS if columns is None else columns)]
+        q = select(TData.id, *cols).order_by(TData.id)
+        if after is not None:
+            q = q.where(TData.id > after)
+        if start is not None:
+            q = q.where(TData.date >= pd.Timestamp(start))
+        if end is not None:
+            q = q.where(TData.date < pd.Timestamp(end))
+        return q
+
     @staticmethod
-    def read_from_db():
+    @timed()
+    def read_from_db(columns: list[str] = None, start=None, end=None, after: int = None):
+        """ Read the given columns (default: all) of the rows with start <= date < end
+        (and id > after)."""
+        q = Data.select_rows(columns, start, end, after)
         try:
-            return read_table(TData).set_index('id')
+            return read_sql(q).set_index('id')
         except Exception as err:
             print(f'could not read {TData.name_} from DB: {err}')
-            return pd.DataFrame(columns=TData.columns_)
+            return pd.DataFrame(columns=list(Data.COLS if columns is None else columns))
+
+    @staticmethod
+    def read(columns: list[str] = None, start=None, end=None) -> pd.DataFrame:
+        """ Read the columns from the snapshot if it is up to date, else from the DB."""
+        df = Snapshot.read(columns, start, end, TEXT_DTYPE)
+        return Data.compact(Data.read_from_db(columns, start, end)) if df is None else df
 
     @staticmethod
-    def read_csv(fname: Path):
+    def compact(df: pd.DataFrame) -> pd.DataFrame:
+        """ Convert the columns read from the DB to a compact layout: categoricals for
+        the low-cardinality columns, float64 for money and arrow strings for free text."""
+        dtypes = {col: 'category' for col in Data.CATEGORICAL}
+        dtypes |= {col: 'float64' for col in Data.MONEY}
+        dtypes |= {col: TEXT_DTYPE for col in Data.TEXT if TEXT_DTYPE is not None}
+        return df.astype({col: t for col, t in dtypes.items() if col in df})
+
+    @staticmethod
+    @timed()  # rows are only counted without chunksize
+    def read_csv(fname: Path, chunksize: int = None):
+        """ Read a bank export, as an iterator of DataFrames if `chunksize` is given."""
         cols = [col for col in TData.column_names if col.lower() != 'id']
         date_cols = [col for col in cols if 'date' in col]
         return pd.read_csv(fname, names=cols, skiprows=1, usecols=range(7),
-                           parse_dates=date_cols, dayfirst=True, decimal=',')
+                           parse_dates=date_cols, dayfirst=True, decimal=',',
+                           chunksize=chunksize)
+
+    def read_csvs(self, fnames: list[Path]) -> list[pd.DataFrame]:
+        """ Read the files, in a process pool if more than one job is requested."""
+        if self.jobs > 1 and len(fnames) > 1:
+            with ProcessPoolExecutor(min(self.jobs, len(fnames))) as ex:
+                return list(ex.map(self.read_csv, fnames))  # keeps the order of fnames
+        return [self.read_csv(f) for f in fnames]
 
     def files_to_update(self, s: Session, update_all=False):
-        x = [f for f in self.fnames if update_all or TFileHash.has_update(s, f)]
-        return sorted(x)
+        fnames = sorted(self.fnames)
+        if update_all:
+            return fnames
+        return [f for f, upd in zip(fnames, TFileHash.has_updates(s, fnames)) if upd]
 
-    def update_(self, force=False):
+    @timed()
+    def update_(self, force=False, history=True):
+        """ :param history: ingest new or changed files, else only recategorise """
         with get_session() as s:
-            hist = self.update_history(s, force)
-            cat = self.update_categories(s, force)
+            last_id = self.last_id(s)
+            hist = self.update_history(s, force) if history else -1
+            new_after = last_id if hist > 0 else None
+            cat = self.update_categories(s, force, new_after=new_after)
+            TMonthly.ensure(s)
+        stamp = Snapshot.stamp()
+        if not Snapshot.is_valid(stamp):
+            self.write_snapshot(stamp)
         if hist > 0 or cat > 0:
-            self[:] = self.read_from_db()
+            self.refresh()
+
+    def write_snapshot(self, stamp: str = None):
+        """ Write the snapshot of the open years; closed years are only written if their
+        segment is missing."""
+        with get_session() as s:
+            years = TPartition.years(s)
+        for year in years:
+            if not Snapshot.has_year(year):
+                self.write_year(year)
+        start = datetime(years[-1] + 1, 1, 1) if years else None
+        if self.chunksize:  # only one chunk of rows in memory, as in stream_history
+            Snapshot.write(self.read_chunks(start), stamp, years, self.n_rows(start))
+        else:
+            Snapshot.write(self.compact(self.read_from_db(start=start)), stamp, years)
+
+    @staticmethod
+    def n_rows(start=None) -> int:
+        """ Number of rows with date >= start."""
+        q = select(func.count()).select_from(TData)
+        if start is not None:
+            q = q.where(TData.date >= start)
+        with get_session() as s:
+            return s.scalar(q)
+
+    def read_chunks(self, start=None) -> Iterator[pd.DataFrame]:
+        """ Read all columns of the rows with date >= start in compacted chunks."""
+        for df in read_sql_chunks(self.select_rows(start=start), self.chunksize):
+            yield self.compact(df.set_index('id'))
+
+    def write_year(self, year: int):
+        df = self.read_from_db(start=datetime(year, 1, 1), end=datetime(year + 1, 1, 1))
+        Snapshot.write_year(year, self.compact(df))
+
+    def close_years(self, until: int) -> list[int]:
+        """ Close all years up to `until`: their rows are no longer ingested or
+        recategorised and only snapshotted once. :returns: the newly closed years """
+        assert until < date.today().year, 'the current year cannot be closed'
+        with get_session() as s:
+            years = TPartition.close(s, until)
+        for year in years:
+            self.write_year(year)
+        self.write_snapshot()
+        self.log.info('closed years %s', years or 'none')
+        return years
+
+    def reopen(self, year: int) -> list[int]:
+        """ Reopen `year` and all later years. Their rows in unchanged files are only
+        ingested with `force_update`. :returns: the reopened years """
+        with get_session() as s:
+            years = TPartition.reopen(s, year)
+        self.write_snapshot()
+        self.log.info('reopened years %s', years)
+        return years
+
+    def refresh(self):
+        """ Reload the loaded columns from the committed state of the DB."""
+        if self.lazy:
+            self._update_inplace(self.read(list(self.columns), self.start, self.end))
+        self.version += 1
+
+    def follow(self, watcher: 'Watcher') -> 'Data':
+        """ Refresh after every ingest of the watcher (called on its thread)."""
+        watcher.subscribe(lambda _: self.refresh())
+        return self
+
+    @staticmethod
+    def last_id(s: Session) -> int:
+        """ Largest id in TData (0 if empty); inserted rows get larger ids."""
+        return s.scalar(select(func.max(TData.id))) or 0
 
+    @timed(rows=lambda n: max(n, 0))
     def update_history(self, s: Session, force=False):
         fnames = self.files_to_update(s, force)
         if len(fnames) == 0:
             return -1
+        last_id = self.last_id(s)
+        if self.chunksize:
+            n = self.stream_history(s, fnames)
+        else:
+            df = pd.concat(self.read_csvs(fnames)).drop_duplicates()
+            for f in fnames:
+                TFileHash.write(s, f)
+            n = self.write(s, df)
+        if n > 0:
+            self.check_balance(s, last_id)
+        return n
 
-        df_in = pd.concat([self.read_csv(f) for f in fnames]).drop_duplicates()
+    def stream_history(self, s: Session, fnames: list[Path]) -> int:
+        """ Insert the new rows of the files chunk by chunk, so that only one chunk is
+        held in memory."""
+        n0, n, skipped, closed, months = len(self), 0, 0, 0, set()
         for f in fnames:
+            for df in self.read_csv(f, self.chunksize):
+                df = df.drop_duplicates()
+                n_read, df = len(df), self.open_rows(s, df)
+                n1 = self.insert_new(s, df)
+                n, skipped = n + n1, skipped + len(df) - n1
+                closed += n_read - len(df)
+                if n1 > 0:
+                    months |= set(df.date.dt.to_period('M').unique())
             TFileHash.write(s, f)
-        if len(self):
-            df_new = pd.concat([self.drop(columns=self.cat.COLS), df_in])
-            # keep only the rows which are not duplicated (not in the DB)
-            df_new = df_new.drop_duplicates(keep=False)
-        else:
-            df_new = df_in
-        if df_new.empty:
-            return 0
-        return self.write(s, df_new.sort_values('date'))
+        self.log_insert(n0, n, skipped, closed)
+        TMonthly.refresh(s, months)
+        return n
 
+    def check_balance(self, s: Session, last_id: int = 0) -> pd.Index:
+        """ Check the running balance of the rows inserted after `last_id` and of the
+        rows between them, with the rows of the day before as neighbours. Breaks are
+        logged as warning. :returns: ids of the rows after a break """
+        q = select(func.min(TData.date), func.max(TData.date)).where(TData.id > last_id)
+        start, end = s.execute(q).one()
+        if start is None:
+            return pd.Index([], name='id')
+        before = s.scalar(select(func.max(TData.date)).where(TData.date < start))
+        by = [] if self.BALANCE_BY is None else [getattr(TData, self.BALANCE_BY)]
+        # money as float, Decimal objects would cost ~10x the time and memory
+        q = select(TData.id, TData.date, cast(TData.amount, Float).label('amount'),
+                   cast(TData.balance, Float).label('balance'), *by).where(
+            TData.date >= (before or start), TData.date < end + timedelta(days=1))
+        df = read_sql(q.order_by(TData.id)).set_index('id')  # copies: the later ids
+        with span('Data.check_balance', rows=len(df)):
+            breaks = self.balance_breaks(df, self.BALANCE_BY)
+        breaks = breaks[df.date.loc[breaks] >= start]  # the neighbours only precede
+        if len(breaks):
+            self.log.warning('running balance broken before %d rows, ids: %s',
+                             len(breaks), list(breaks[:20]))
+        return breaks
+
+    @staticmethod
+    def balance_breaks(df: pd.DataFrame, by: str = None) -> pd.Index:
+        """ Rows whose previous balance (balance - amount) is not matched by a row with
+        that balance (of the same `by` group): per value, the rows with prev == value
+        beyond the number of rows with balance == value are rows after a gap or double
+        imports (the later ids of equal rows). Amounts are compared in grosz and the
+        rows may be in any order within a day; the first of these rows on the first
+        date (of a group) is the start of the history.
+        :returns: the index (ids) of the rows after a break """
+        if df.empty:
+            return df.index[:0]
+        balance = np.rint(df.balance.to_numpy(float) * 100).astype('i8')
+        prev = balance - np.rint(df.amount.to_numpy(float) * 100).astype('i8')
+        group = np.zeros(len(df), 'i8') if by is None else \
+            pd.factorize(df[by], use_na_sentinel=False)[0]
+        # one code per (group, value), so that both counts are aligned on the codes
+        values, uniques = pd.factorize(np.concatenate([balance, prev]))
+        codes = np.tile(group, 2) * len(uniques) + values
+        balance, prev = codes[:len(df)], codes[len(df):]
+        n_balance = np.bincount(balance, minlength=codes.max() + 1)
+        rank = pd.Series(prev).groupby(prev).cumcount().to_numpy()  # n-th row of prev
+        ok = rank < n_balance[prev]
+        date = df.date.to_numpy()
+        first = date == pd.Series(date).groupby(group).transform('min').to_numpy()
+        start = ~ok & first
+        start[start] = ~pd.Series(group[start]).duplicated().to_numpy()
+        return df.index[~ok & ~start]
+
+    @timed()
     def filter_allowed_duplicates(self, df: pd.DataFrame) -> pd.DataFrame:
         fname = self.DIR / 'allowed_duplicates.json'
         data = json.loads(fname.read_text())
@@ -118,54 +443,94 @@ class Data(pd.DataFrame):
             df.loc[mask, 'n_matches'] = df.loc[mask, 'n_matches'].clip(upper=1)
         return df
 
-    def match_categories(self, overwrite=False) -> pd.DataFrame:
-        df = self.copy()
-        if not overwrite:
-            df = df[df.category.isna()]
-        df['n_matches'] = 0
-        df['new'] = False
-        upd_cols = [f'updated_{col}' for col in self.cat.COLS]
-        df[upd_cols] = [False, False]
-        for (cat, sub_cat, tag_type), tags in self.cat.agg_lists().items():
-            pattern = '|'.join(tags)
-            mask = df[tag_type].str.lower().str.contains(pattern, na=False, regex=True)
-
-            df.loc[mask, 'new'] = df.loc[mask, self.cat.COLS[0]].isna()
-            df.loc[mask, 'n_matches'] += 1
+    def tagged(self, after: int = None) -> pd.DataFrame:
+        """ Columns to categorise of the rows of the open years, also outside the loaded
+        range. :param after: only rows with a larger id (inserted rows, which are never
+        in closed years) """
+        cols = ['date', *TData.TYPE_ORDER, *self.cat.COLS]
+        if after is not None:  # the id range only, without a date scan
+            return self.read_from_db(cols, after=after)
+        return self.read_from_db(cols, start=self.open_start())
 
-            new = df.loc[mask, 'new']
-            matched = df.loc[mask, 'n_matches'] > 1
-            changed = df.loc[mask, self.cat.COLS] != [cat, sub_cat]
-            df.loc[mask, upd_cols] = changed.apply(lambda c: c & ~new & ~matched).values
+    def changed_rows(self, df: pd.DataFrame = None, new_after: int = None) -> pd.Series:
+        """ Mask of the rows affected by the tags changed in the categories file: rows
+        matching an added or removed tag, rows of sub-categories which lost a tag and
+        rows inserted since the last update (id > new_after)."""
+        df = self.tagged() if df is None else df
+        delta = self.cat.delta
+        rows = pd.Series(False if new_after is None else df.index > new_after, df.index)
+        if not delta.tags:
+            return rows
+        res = TagMatcher(self.cat.agg_lists(delta.tags)).match(df)
+        lost = pd.MultiIndex.from_frame(df[self.cat.COLS]).isin(delta.sub_categories)
+        return rows | (res.n_matches > 0) | lost
 
-            df.loc[mask, self.cat.COLS] = [cat, sub_cat]
+    @timed()
+    def match_categories(self, overwrite=False, rows: pd.Series = None,
+                         df: pd.DataFrame = None) -> pd.DataFrame:
+        df = self.tagged() if df is None else df
+        df = df.copy() if rows is None else df[rows].copy()
+        if not overwrite:
+            df = df[df.category.isna()]
+        cols = self.cat.COLS
+        res = self.cat.matcher.match(df)
+        # rows matching multiple tags are neither new nor updated
+        single = res.n_matches == 1
+        df['n_matches'] = res.n_matches
+        df['new'] = single & df.category.isna()
+        for col in cols:
+            df[f'updated_{col}'] = single & ~df.new & (df[col] != res[col])
+        matched = res.n_matches > 0
+        df.loc[matched, cols] = res.loc[matched, cols]
         return df
 
-    def update_categories(self, s: Session, force=False, overwrite=True):
-        if not self.cat.was_updated and not force:
+    @staticmethod
+    def write_categories(s: Session, df: pd.DataFrame):
+        """ Write the categories of the rows in `df` (indexed by id) with executemany."""
+        if df.empty:
+            return
+        df = df[Categories.COLS].astype(object)
+        # bind names must differ from the column names
+        df = df.where(df.notna(), None).add_suffix('_').rename_axis('id_').reset_index()
+        t = TData.__table__
+        stmt = update(t).where(t.c.id == bindparam('id_')).values(
+            {col: bindparam(f'{col}_') for col in Categories.COLS})
+        s.execute(stmt, df.to_dict('records'))
+
+    @timed(rows=lambda n: max(n, 0))
+    def update_categories(self, s: Session, force=False, overwrite=True,
+                          new_after: int = None):
+        """ :param new_after: rows with a larger id were inserted, which are categorised
+                              even if the categories did not change """
+        if not (self.cat.was_updated or force or new_after is not None):
             return -1
-        df = self.match_categories(overwrite)
+        if force:
+            df, rows = self.tagged(), None
+        elif self.cat.delta.tags or new_after is None:
+            # only re-evaluate the new rows and those affected by the changed tags
+            df = self.tagged()
+            rows = self.changed_rows(df, new_after)
+        else:  # only the new rows, O(inserted rows)
+            df, rows = self.tagged(after=new_after), None
+        df = self.match_categories(overwrite, rows, df)
         df = self.filter_allowed_duplicates(df)
         df_upd = df[~df.category.isna()]
         if not df_upd.empty:
             counts = df.n_matches.value_counts()
             if (counts.index > 1).any():
-                self.log.warning(f'{counts[counts.index > 1].sum()} '
-                                 f'rows matched multiple tags')
+                self.log.warning('%d rows matched multiple tags',
+                                 counts[counts.index > 1].sum())
             cols = ['new'] + [f'updated_{col}' for col in self.cat.COLS]
             df_upd = df_upd[df_upd[cols].any(axis=1)]
-            for idx, row in df_upd.iterrows():
-                s.query(TData).filter(TData.id == idx).update({
-                    TData.category: row.category,
-                    TData.sub_category: row.sub_category},
-                    synchronize_session=False)
+            self.write_categories(s, df_upd)
+            TMonthly.refresh(s, df_upd.date.dt.to_period('M').unique())
             if df.new.any():
-                self.log.info(f'categorised {df.new.sum()} new rows in {TData.name_}')
+                self.log.info('categorised %d new rows in %s', df.new.sum(), TData.name_)
             for col in cols[1:]:
                 if df_upd[col].any():
                     name = col.replace('updated_', '')
-                    self.log.info(f'updated {name} of {df_upd[col].sum()} rows in '
-                                  f'{TData.name_}')
+                    self.log.info('updated %s of %d rows in %s', name, df_upd[col].sum(),
+                                  TData.name_)
             return len(df_upd)
         return 0
     # endregion INIT & UPDATE
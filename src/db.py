@@ -1,8 +1,9 @@
 from contextlib import contextmanager
-from typing import Type
+from functools import cache
+from typing import Type, Iterator
 
 import pandas as pd
-from sqlalchemy import create_engine, select, Select, Table
+from sqlalchemy import create_engine, select, Select, Table, inspect, text, Engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
 
 from src.tables import Base, MyBase
@@ -10,33 +11,96 @@ from src.utils import bytes2str
 
 DATABASE_URL = 'sqlite:///example.db'
 
-# Engine as a module-level singleton
-engine = create_engine(DATABASE_URL, echo=False)
-
-# Session factory / scoped session (safer for threaded apps)
-SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False,
-                                           autocommit=False))
+# SQLite pragmas set on every new connection (None for the SQLite defaults)
+PROFILE = {
+    'journal_mode': 'WAL',  # readers and the writer do not block each other
+    'synchronous': 'NORMAL',  # with WAL only sync at checkpoints
+    'cache_size': -64_000,  # page cache of 64 MB (negative: in KiB)
+    'mmap_size': 256 << 20,  # memory-map up to 256 MB of the DB file
+    'temp_store': 'MEMORY',  # temporary tables and indices in memory
+}
+
+# Session factory / scoped session (safer for threaded apps), bound on first use
+SessionLocal = scoped_session(sessionmaker(autoflush=False, autocommit=False))
+
+
+def make_engine(url: str = DATABASE_URL, profile: dict = None) -> Engine:
+    """Create an engine which sets the pragmas of `profile` on every connection."""
+    engine = create_engine(url, echo=False)
+    if profile:
+        @event.listens_for(engine, 'connect')
+        def set_pragmas(dbapi_con, _):
+            cur = dbapi_con.cursor()
+            for key, value in profile.items():
+                cur.execute(f'PRAGMA {key} = {value}')
+            cur.close()
+    return engine
+
+
+@cache
+def get_engine() -> Engine:
+    """Create the engine singleton and the tables on first use."""
+    engine = make_engine(DATABASE_URL, PROFILE)
+    SessionLocal.configure(bind=engine)
+    init_db(engine)
+    return engine
+
+
+def __getattr__(name: str):
+    if name == 'engine':  # module-level engine, created on first access
+        return get_engine()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def init_db(engine: Engine = None) -> None:
+    """Create tables (done when the engine is created)."""
+    engine = engine or get_engine()
+    Base.metadata.create_all(engine)
+    migrate(engine)
 
 
-def init_db() -> None:
-    """Create tables (call once at startup)."""
-    Base.metadata.create_all(engine)
+def migrate(engine: Engine = None) -> None:
+    """Add nullable columns and indices which were added to the models to an existing
+    DB."""
+    engine = engine or get_engine()
+    insp = inspect(engine)
+    with engine.begin() as con:
+        for name, table in Base.metadata.tables.items():
+            cols = {c['name'] for c in insp.get_columns(name)}
+            for col in table.columns:
+                if col.name not in cols and col.nullable:
+                    type_ = col.type.compile(engine.dialect)
+                    con.execute(text(f'ALTER TABLE {name} ADD COLUMN {col.name} {type_}'))
+            for index in table.indexes:
+                index.create(con, checkfirst=True)
 
 
 def read_table(table: Type[MyBase]) -> pd.DataFrame:
-    with get_session() as session:
-        return pd.read_sql(select(table), session.get_bind())
+    return read_sql(select(table))
 
 
 def read_sql(query: str | Select) -> pd.DataFrame:
+    # use the connection of the session to see its uncommitted changes
     with get_session() as session:
-        return pd.read_sql(query, session.get_bind())
+        return pd.read_sql(query, session.connection())
+
+
+def read_sql_chunks(query: str | Select, chunksize: int) -> Iterator[pd.DataFrame]:
+    """ Read the result in DataFrames of `chunksize` rows, fetched while iterating."""
+    with get_session() as session:
+        yield from pd.read_sql(query, session.connection(), chunksize=chunksize)
 
 
 @contextmanager
 def get_session():
-    """Yield a DB session and ensure it is closed."""
+    """Yield a DB session and ensure it is closed. Nested calls yield the same session,
+    which is only committed and closed by the outermost call."""
+    get_engine()
     session = SessionLocal()
+    if session.info.get('open'):
+        yield session
+        return
+    session.info['open'] = True
     try:
         yield session
         session.commit()
@@ -44,13 +108,14 @@ def get_session():
         session.rollback()
         raise
     finally:
+        session.info['open'] = False
         session.close()
 
 
 def list_table_sizes():
     """ Print per-table sizes (bytes) using dbstat if present. """
     # dbstat returns page-level sizes per object; sum by object name
-    t = Table('dbstat', Base.metadata, autoload_with=engine)
+    t = Table('dbstat', Base.metadata, autoload_with=get_engine())
     q = select(t).where(~t.c.name.contains('autoindex'),
                         t.c.name != 'sqlite_schema')
     df = read_sql(q).groupby('name')[['ncell', 'pgsize']].sum()
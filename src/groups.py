@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+
+class GroupIndex:
+    """
+    Positions of the rows of a frame per value of the columns category, sub_category,
+    vendor and account. Each column is indexed on first use with one stable argsort of
+    its codes, so that the positions of a value are a contiguous and sorted slice and
+    a lookup costs O(size of the result).
+    """
+
+    COLS = ['category', 'sub_category', 'vendor', 'account']
+
+    def __init__(self, df: pd.DataFrame, version: int = 0):
+        self.df, self.version = df, version
+        self.groups = {}  # col -> (values, offsets, order)
+
+    def group(self, col: str) -> tuple[pd.Index, np.ndarray, np.ndarray]:
+        if col not in self.groups:
+            x = self.df[col]
+            if isinstance(x.dtype, pd.CategoricalDtype):
+                codes, values = x.cat.codes.to_numpy(), x.cat.categories
+            else:
+                codes, values = pd.factorize(x)
+            # slot 0 holds the missing values (code -1)
+            counts = np.bincount(codes + 1, minlength=len(values) + 1)
+            offsets = np.r_[0, np.cumsum(counts)]
+            self.groups[col] = values, offsets, np.argsort(codes, kind='stable')
+        return self.groups[col]
+
+    def positions(self, col: str, value) -> np.ndarray:
+        """ Sorted positions of the rows with `value` in `col` (None or NaN: missing)."""
+        values, offsets, order = self.group(col)
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            code = -1
+        elif value in values:
+            code = values.get_loc(value)
+        else:
+            return order[:0]
+        return order[offsets[code + 1]:offsets[code + 2]]
+
+    def select(self, **values) -> np.ndarray:
+        """ Sorted positions of the rows matching all the given column values."""
+        unknown = set(values) - set(self.COLS)
+        assert len(unknown) == 0, f'no group index for {unknown}'
+        pos = sorted((self.positions(col, v) for col, v in values.items()), key=len)
+        res = pos[0] if pos else np.arange(len(self.df))
+        for p in pos[1:]:
+            res = np.intersect1d(res, p, assume_unique=True)
+        return res
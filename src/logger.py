@@ -1,22 +1,26 @@
+import atexit
 import logging
 import logging.handlers
+import queue
 from pathlib import Path
 from src.utils import TOP_DIR
-from colored import fg, attr
 import sys
 
 
 class ColoredFormatter(logging.Formatter):
     """Custom formatter with colored log levels"""
 
-    COLORS = {
-        'DEBUG': fg('cyan'),
-        'INFO': fg('green'),
-        'WARNING': fg('yellow'),
-        'ERROR': fg('red'),
-        'CRITICAL': fg('magenta')
-    }
-    RESET = attr('reset')
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        from colored import fg, attr  # imported when the first logger is set up
+        self.COLORS = {
+            'DEBUG': fg('cyan'),
+            'INFO': fg('green'),
+            'WARNING': fg('yellow'),
+            'ERROR': fg('red'),
+            'CRITICAL': fg('magenta')
+        }
+        self.RESET = attr('reset')
 
     def format(self, record):
         # Store original levelname
@@ -30,9 +34,59 @@ class ColoredFormatter(logging.Formatter):
         return formatted
 
 
+class FileRouter(logging.Handler):
+    """ Hands the records of every logger to the file handler of the logger."""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.handlers: dict[str, logging.Handler] = {}
+
+    def emit(self, record):
+        handler = self.handlers.get(record.name)
+        if handler is not None and record.levelno >= handler.level:
+            handler.handle(record)
+
+    def flush(self):
+        for handler in list(self.handlers.values()):
+            handler.flush()
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """ Enqueues the records unformatted: the message, the arguments and exceptions are
+    formatted on the listener thread (the queue does not leave the process)."""
+
+    def prepare(self, record):
+        return record
+
+
+FMT = '%(asctime)s: %(name)s - %(levelname)s -> %(message)s'
+DATEFMT = '%Y-%m-%d %H:%M:%S'
+_QUEUE = queue.SimpleQueue()
+_FILES = FileRouter()
+_LISTENER: logging.handlers.QueueListener | None = None
+
+
+def listener() -> logging.handlers.QueueListener:
+    """ The thread writing the records of all loggers, started on first use and flushed
+    and stopped at exit."""
+    global _LISTENER
+    if _LISTENER is None:
+        # Console handler with colors
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(ColoredFormatter(FMT, datefmt=DATEFMT))
+
+        _LISTENER = logging.handlers.QueueListener(_QUEUE, console_handler, _FILES,
+                                                   respect_handler_level=True)
+        _LISTENER.start()
+        atexit.register(_LISTENER.stop)  # writes the queued records
+    return _LISTENER
+
+
 def setup_logger(name: str, log_dir: Path = None) -> logging.Logger:
     """
-    Configure logger with console and file handlers.
+    Configure logger with console and file output. The logger only enqueues its records,
+    which are written by a background thread (see `listener`).
 
     Args:
         name: Logger name
@@ -41,34 +95,26 @@ def setup_logger(name: str, log_dir: Path = None) -> logging.Logger:
     Returns:
         Configured logger instance
     """
-    log_dir = log_dir or (TOP_DIR / 'logs')
-    log_dir.mkdir(parents=True, exist_ok=True)
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG)
 
     if logger.hasHandlers():
         return logger
 
-    fmt = '%(asctime)s: %(name)s - %(levelname)s -> %(message)s'
-    datefmt = '%Y-%m-%d %H:%M:%S'
-
-    # Console handler with colors
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    console_formatter = ColoredFormatter(fmt, datefmt=datefmt)
-    console_handler.setFormatter(console_formatter)
+    log_dir = log_dir or (TOP_DIR / 'logs')
+    log_dir.mkdir(parents=True, exist_ok=True)
 
-    # File handler
+    listener()
+    # File handler, rotated on the listener thread
     file_handler = logging.handlers.RotatingFileHandler(
         log_dir / f'{name}.log',
         maxBytes=10 * 1024 * 1024,  # 10MB
         backupCount=5
     )
     file_handler.setLevel(logging.DEBUG)
-    file_formatter = logging.Formatter(fmt, datefmt=datefmt)
-    file_handler.setFormatter(file_formatter)
+    file_handler.setFormatter(logging.Formatter(FMT, datefmt=DATEFMT))
+    _FILES.handlers[name] = file_handler
 
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    logger.addHandler(DeferredQueueHandler(_QUEUE))
 
     return logger
@@ -0,0 +1,113 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+REGEX_CHARS = set('.^$*+?{}[]\\|()')  # tags with one of these are regular expressions
+
+
+def trie(words: list[str]) -> str:
+    """ Regex of the literal `words` as a trie of nested alternations: matching costs
+    O(length of the match) per position instead of one attempt per word, and the
+    greedy optional groups return the longest word starting at a position."""
+    root = {}
+    for w in words:
+        node = root
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[''] = {}  # end of a word
+
+    def walk(node: dict) -> str:
+        alts = [re.escape(ch) + walk(child) for ch, child in node.items() if ch]
+        if not alts:
+            return ''
+        body = alts[0] if len(alts) == 1 else f'(?:{"|".join(alts)})'
+        return f'(?:{body})?' if '' in node else body
+    return walk(root)
+
+
+class TagMatcher:
+    """
+    Compiled matcher for all tags of the categories.
+
+    Per tag type, the literal tags of all (category, sub_category, tag_type) groups form
+    one trie regex, which is scanned once per distinct text value with an overlapping
+    `finditer`. The longest tag found at a position stands for all tags which are its
+    prefixes, so every matching tag is found in one pass, whatever the number of tags.
+    Groups with tags that are regular expressions fall back to one vectorised
+    `str.contains` per group. If several groups match, the last one in the order of
+    `Categories.agg_lists` wins (same as matching the groups in a loop).
+    """
+
+    COLS = ['category', 'sub_category']
+    CACHE = {}  # key -> matcher of the last key, see `cached`
+
+    def __init__(self, tags: pd.Series):
+        self.groups = list(tags.index)  # (category, sub_category, tag_type)
+        self.patterns = {}  # tag_type -> (trie pattern, tag -> groups of its prefixes)
+        self.regex = {}  # tag_type -> [(group, pattern)]
+        for tag_type in dict.fromkeys(g[2] for g in self.groups):
+            literal = {}  # tag -> groups
+            self.regex[tag_type] = []
+            for i, g in enumerate(self.groups):
+                if g[2] != tag_type:
+                    continue
+                words = [t for t in tags.iloc[i] if REGEX_CHARS.isdisjoint(t)]
+                for w in words:
+                    literal.setdefault(w, []).append(i)
+                if len(words) < len(tags.iloc[i]):
+                    pattern = '|'.join(t for t in tags.iloc[i] if t not in words)
+                    self.regex[tag_type].append((i, pattern))
+            prefixes = {w: sorted({i for k in range(len(w) + 1)
+                                   for i in literal.get(w[:k], [])}) for w in literal}
+            pattern = re.compile(f'(?=({trie(list(literal))}))', re.S)
+            self.patterns[tag_type] = (pattern if literal else None, prefixes)
+
+    @classmethod
+    def cached(cls, key: str, tags: callable) -> 'TagMatcher':
+        """ The matcher for `key` (e.g. the hash of the categories file), built from
+        `tags()` once per process."""
+        if key not in cls.CACHE:
+            cls.CACHE.clear()
+            cls.CACHE[key] = cls(tags())
+        return cls.CACHE[key]
+
+    def scan(self, values: pd.Series, tag_type: str) -> tuple[np.ndarray, np.ndarray]:
+        """ :returns: number of matched groups and the last matched group per row """
+        pattern, prefixes = self.patterns[tag_type]
+        codes, uniques = pd.factorize(values.str.lower())
+        pos, hits = [], []  # (distinct value, group) pairs
+        if pattern is not None:
+            for i, value in enumerate(uniques):
+                for m in pattern.finditer(value):
+                    groups = prefixes[m.group(1)]
+                    pos += [i] * len(groups)
+                    hits += groups
+        if self.regex[tag_type]:
+            x = pd.Series(uniques, dtype=object)
+            for group, regex in self.regex[tag_type]:
+                found = np.flatnonzero(x.str.contains(regex, regex=True).to_numpy(bool))
+                pos += found.tolist()
+                hits += [group] * len(found)
+        n, last = np.zeros(len(uniques) + 1, 'i4'), np.full(len(uniques) + 1, -1, 'i4')
+        if hits:
+            pairs = np.unique(np.array([pos, hits], 'i8').T, axis=0)  # once per group
+            np.add.at(n, pairs[:, 0], 1)
+            np.maximum.at(last, pairs[:, 0], pairs[:, 1])
+        return n[codes], last[codes]  # code -1 (NaN) points to the empty last entry
+
+    def match(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Match all rows of `df` against the tags with one scan per tag type column.
+        :returns: DataFrame with the matched category, sub_category and n_matches per row
+        """
+        n, last = np.zeros(len(df), 'i4'), np.full(len(df), -1, 'i4')
+        for tag_type in self.patterns:
+            n_col, last_col = self.scan(df[tag_type], tag_type)
+            n += n_col
+            last = np.maximum(last, last_col)
+        groups = pd.DataFrame([g[:2] for g in self.groups] + [(None, None)],
+                              columns=self.COLS)
+        res = groups.iloc[last].set_axis(df.index)  # -1 selects the (None, None) row
+        res['n_matches'] = n
+        return res
@@ -0,0 +1,179 @@
+"""
+Lightweight HTML rendering of large tables: only the rows of the visible page are
+formatted and written, so the size and time of the output do not depend on the length
+of the table. Background gradients are normalised over the whole table with NumPy.
+"""
+import warnings
+from copy import copy
+from html import escape
+
+import numpy as np
+import pandas as pd
+
+
+class Gradient:
+    """ Colours of a colour map as in Styler.background_gradient: normalised per column
+    (axis=0), per row (axis=1) or over the whole table (axis=None). Values outside the
+    mask and NaN are not coloured."""
+
+    def __init__(self, x: np.ndarray, mask: np.ndarray = None, cmap='Blues_r', axis=0):
+        x = x if mask is None else np.where(mask, x, np.nan)
+        with warnings.catch_warnings():  # all-NaN rows or columns
+            warnings.simplefilter('ignore', RuntimeWarning)
+            lo = np.nanmin(x, axis=axis, keepdims=True)
+            hi = np.nanmax(x, axis=axis, keepdims=True)
+        self.x, self.cmap = x, cmap
+        self.lo, self.rng = (np.broadcast_to(v, x.shape) for v in (lo, hi - lo))
+
+    @staticmethod
+    def luminance(rgb: np.ndarray) -> np.ndarray:
+        """ Relative luminance of sRGB colours (last axis)."""
+        rgb = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+        return rgb @ [0.2126, 0.7152, 0.0722]
+
+    def colours(self, rows: slice) -> tuple[np.ndarray, np.ndarray]:
+        """ :returns: background and text colours (hex, empty if not coloured) """
+        from matplotlib import colormaps  # slow import, only needed for gradients
+        x, lo, rng = self.x[rows], self.lo[rows], self.rng[rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            norm = np.where(rng > 0, (x - lo) / rng, 0)
+        rgb = colormaps[self.cmap](norm)[..., :3]
+        code = (np.round(rgb * 255).astype(int) * [1 << 16, 1 << 8, 1]).sum(-1)
+        bkg = np.array([f'#{c:06x}' for c in code.ravel()], object).reshape(code.shape)
+        text = np.where(self.luminance(rgb) < 0.408, '#f1f1f1', '#000000').astype(object)
+        nan = np.isnan(x)
+        bkg[nan], text[nan] = '', ''
+        return bkg, text
+
+
+class Page:
+    """
+    One page of `limit` rows of a table, starting at row `offset`, as HTML (shown by
+    notebooks via `_repr_html_`). Other pages are created with `page`, `next` and
+    `prev`; they share the background gradient of the whole table.
+    """
+
+    SIZE = 50  # default number of rows per page
+
+    def __init__(self, df: pd.DataFrame, caption: str = '', fmt: str = '{:,.0f}',
+                 offset: int = 0, limit: int = SIZE, na_rep: str = '', bkg=False,
+                 subset: tuple = None, cmap='Blues_r', axis=0):
+        """
+        :param subset: masks of the (rows, columns) with a background gradient
+        """
+        self.df, self.caption, self.fmt, self.na_rep = df, caption, fmt, na_rep
+        self.offset, self.limit = max(0, offset), max(1, limit)
+        self.gradient = None
+        if bkg:
+            mask = None if subset is None else np.outer(*subset)
+            self.gradient = Gradient(df.to_numpy(float), mask, cmap, axis)
+
+    def __len__(self):
+        return len(self.df)
+
+    def _repr_html_(self) -> str:
+        return self.to_html()
+
+    # --------------------------------------------
+    # region PAGES
+    @property
+    def n_pages(self) -> int:
+        return max(1, -(-len(self.df) // self.limit))
+
+    @property
+    def number(self) -> int:
+        return self.offset // self.limit
+
+    @property
+    def rows(self) -> slice:
+        return slice(self.offset, min(self.offset + self.limit, len(self.df)))
+
+    def at(self, offset: int) -> 'Page':
+        """ The page starting at row `offset`."""
+        page = copy(self)
+        page.offset = min(max(0, offset), max(0, len(self.df) - 1))
+        return page
+
+    def page(self, n: int) -> 'Page':
+        """ Page number `n` (negative numbers count from the end)."""
+        return self.at((n % self.n_pages if n < 0 else n) * self.limit)
+
+    def next(self) -> 'Page':
+        return self.at(self.offset + self.limit)
+
+    def prev(self) -> 'Page':
+        return self.at(self.offset - self.limit)
+
+    def set_caption(self, caption: str) -> 'Page':
+        self.caption = caption
+        return self
+    # endregion PAGES
+    # --------------------------------------------
+
+    # --------------------------------------------
+    # region HTML
+    def cell(self, x) -> str:
+        if pd.isna(x):
+            return self.na_rep
+        is_number = isinstance(x, (int, float, np.number))
+        return escape(self.fmt.format(x) if is_number else str(x))
+
+    @staticmethod
+    def header(columns: pd.Index) -> list[list[tuple[str, int]]]:
+        """ Labels and spans of the levels of the columns. Neighbours are merged if their
+        labels are equal up to the level (except on the last level)."""
+        labels, res = columns.to_frame(index=False).to_numpy(object), []
+        for k in range(columns.nlevels):
+            spans = []
+            for j in range(len(labels)):
+                if (0 < j and k < columns.nlevels - 1
+                        and (labels[j, :k + 1] == labels[j - 1, :k + 1]).all()):
+                    spans[-1][1] += 1
+                else:
+                    spans.append([labels[j, k], 1])
+            res.append([(escape(str(v)), n) for v, n in spans])
+        return res
+
+    @staticmethod
+    def label(idx: np.ndarray, i: int, k: int) -> str:
+        """ Label of level `k` of row `i`, empty if the row repeats the labels of the row
+        before up to the level (except on the last level)."""
+        last = k == idx.shape[1] - 1
+        if 0 < i and not last and (idx[i, :k + 1] == idx[i - 1, :k + 1]).all():
+            return ''
+        return '' if pd.isna(idx[i, k]) else escape(str(idx[i, k]))
+
+    def to_html(self) -> str:
+        rows, df = self.rows, self.df
+        window = df.iloc[rows]
+        n_idx = df.index.nlevels
+        html = ['<table class="expenses-page">']
+        r0, r1 = rows.start, rows.stop
+        info = f'rows {r0 + 1}-{r1} of {len(df)}, page {self.number + 1}/{self.n_pages}'
+        html.append(f'<caption>{escape(self.caption)} ({info})</caption>')
+        html.append('<thead>')
+        names = df.columns.names
+        for name, spans in zip(names, self.header(df.columns)):
+            th = ''.join(f'<th colspan="{n}">{v}</th>' if n > 1 else f'<th>{v}</th>'
+                         for v, n in spans)
+            label = escape(str(name)) if name is not None else ''
+            html.append(f'<tr>{"<th></th>" * (n_idx - 1)}<th>{label}</th>{th}</tr>')
+        if any(name is not None for name in df.index.names):
+            ths = ''.join(f'<th>{escape(str(n or ""))}</th>' for n in df.index.names)
+            html.append(f'<tr>{ths}{"<th></th>" * len(df.columns)}</tr>')
+        html.append('</thead><tbody>')
+        bkg, text = (None, None) if self.gradient is None else self.gradient.colours(rows)
+        idx = window.index.to_frame(index=False).to_numpy(object)
+        values = window.to_numpy(object)
+        for i in range(len(window)):
+            ths = ''.join(f'<th>{self.label(idx, i, k)}</th>' for k in range(n_idx))
+            tds = []
+            for j, x in enumerate(values[i]):
+                style = '' if bkg is None or not bkg[i, j] else (
+                    f' style="background-color: {bkg[i, j]}; color: {text[i, j]}"')
+                tds.append(f'<td{style}>{self.cell(x)}</td>')
+            html.append(f'<tr>{ths}{"".join(tds)}</tr>')
+        html.append('</tbody></table>')
+        return '\n'.join(html)
+    # endregion HTML
+    # --------------------------------------------
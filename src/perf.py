@@ -0,0 +1,134 @@
+"""
+Timing spans for the update pipeline.
+
+Spans are opened with `span(name)` or the `timed` decorator. The first span opened
+while no run is active starts a run which collects all nested spans (also those of
+other threads) and appends a summary to logs/perf.jsonl when it closes: calls, duration,
+rows and rows/s per span name. Disabled by default (enable with `enable()` or the
+environment variable EXPENSES_PERF=1); disabled spans cost one flag check.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from typing import Callable
+
+from src.utils import TOP_DIR
+
+ENABLED = os.environ.get('EXPENSES_PERF', '') not in ('', '0')
+FNAME = TOP_DIR / 'logs' / 'perf.jsonl'
+
+_LOCK = threading.Lock()
+_RUN = None  # the active run
+LAST = None  # summary of the last finished run
+
+
+def enable(on: bool = True):
+    global ENABLED
+    ENABLED = on
+
+
+def n_rows(res) -> int | None:
+    """ Default row count of a result: its length if it has one."""
+    return len(res) if hasattr(res, '__len__') else None
+
+
+class Run:
+    """ Durations and rows per span name of one top-level span and its children."""
+
+    def __init__(self, root: 'Span'):
+        self.root, self.start = root, datetime.now().isoformat(timespec='milliseconds')
+        self.spans = {}  # name -> [calls, seconds, rows]
+        self.seconds = None  # duration of the root span
+
+    def add(self, span: 'Span', t: float):
+        stats = self.spans.setdefault(span.name, [0, 0., None])
+        stats[0] += 1
+        stats[1] += t
+        if span.rows is not None:
+            stats[2] = (stats[2] or 0) + span.rows
+
+    def summary(self) -> dict:
+        spans = [{'name': name, 'calls': calls, 'seconds': round(t, 6), 'rows': rows,
+                  'rows_per_s': round(rows / t, 1) if rows and t > 0 else None}
+                 for name, (calls, t, rows) in self.spans.items()]
+        return {'start': self.start, 'run': self.root.name, 'pid': os.getpid(),
+                'seconds': round(self.seconds, 6), 'spans': spans}
+
+    def write(self):
+        global LAST
+        LAST = self.summary()
+        FNAME.parent.mkdir(parents=True, exist_ok=True)
+        with open(FNAME, 'a') as f:
+            f.write(json.dumps(LAST) + '\n')
+
+
+class Span:
+    """ Timing of a block; `rows` may be set inside the block. It is added to the run it
+    joined, which is already written if the span ends after the root span (e.g. on
+    another thread)."""
+    __slots__ = ('name', 'rows', 't0', 'run')
+
+    def __init__(self, name: str, rows: int = None):
+        self.name, self.rows = name, rows
+
+    def __enter__(self):
+        global _RUN
+        with _LOCK:
+            if _RUN is None:
+                _RUN = Run(self)
+            self.run = _RUN
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _RUN
+        t = time.perf_counter() - self.t0
+        run = self.run
+        with _LOCK:
+            run.add(self, t)
+            if run.root is self:
+                _RUN, run.seconds = None, t
+        if run.root is self:
+            run.write()
+        return False
+
+
+class _NoSpan:
+    """ Stand-in for a span while timing is disabled."""
+    __slots__ = ()
+    rows = property(lambda self: None, lambda self, value: None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+def span(name: str, rows: int = None) -> Span | _NoSpan:
+    """ Context manager timing its block as `name` (if enabled)."""
+    return Span(name, rows) if ENABLED else NO_SPAN
+
+
+def timed(name: str = None, rows: Callable = n_rows):
+    """ Decorator timing each call of the function as `name` (default: its qualified
+    name). :param rows: function of the result returning the number of rows """
+    def decorator(f):
+        label = name or f.__qualname__
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return f(*args, **kwargs)
+            with Span(label) as s:
+                res = f(*args, **kwargs)
+                s.rows = rows(res)
+            return res
+        return wrapper
+    return decorator
@@ -0,0 +1,69 @@
+"""
+Plotly figures with many series: WebGL traces, datetime axes built from period indices,
+LTTB downsampling of long series and static HTML files which are only re-rendered if
+their content changed.
+"""
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+MAX_UNIFIED = 10  # max number of traces with a unified hover box
+
+
+def month_starts(index: pd.MultiIndex) -> pd.DatetimeIndex:
+    """ First days of the months of a (year, month) index."""
+    years, months = (index.get_level_values(i).to_numpy('i8') for i in range(2))
+    months = ((years - 1970) * 12 + months - 1).astype('datetime64[M]')
+    return pd.DatetimeIndex(months.astype('datetime64[s]'))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """ Largest-Triangle-Three-Buckets downsampling of a series sorted by x: keeps the
+    first and last point and of every of the n - 2 buckets in between the point with
+    the largest triangle to the previous kept point and the mean of the next bucket.
+    :returns: indices of the kept points """
+    size = len(x)
+    if n is None or n >= size or n < 3:
+        return np.arange(size)
+    x = (x.view('i8') if x.dtype.kind == 'M' else x).astype(float)
+    y = np.asarray(y, float)
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    idx = np.empty(n, int)
+    idx[0], idx[-1], a = 0, size - 1, 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = slice(hi, edges[i + 2] if i + 2 < n - 1 else size)
+        cx, cy = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = idx[i + 1] = lo + area.argmax()
+    return idx
+
+
+def figure(traces: list[dict], title: str, xaxis_title: str, mode='lines+markers'):
+    """ Figure with one WebGL trace per dict (x, y, name and optionally legendgroup)."""
+    import plotly.graph_objects as go  # slow import, only needed for plotting
+    style = dict(mode=mode, line=dict(width=2), marker=dict(size=8))
+    fig = go.Figure([go.Scattergl(**style, **t) for t in traces])  # one layout pass
+    fig.update_layout(
+        title=title,
+        xaxis_title=xaxis_title,
+        yaxis_title='Amount [PLN]',
+        hovermode='x unified' if len(traces) <= MAX_UNIFIED else 'closest',
+        template='plotly_white'
+    )
+    return fig
+
+
+def write_html(fname: Path, key: str, make: Callable) -> Path:
+    """ Write the figure returned by `make` to a self-contained HTML file, unless the
+    file was already written for the same `key`."""
+    stamp = f'<!-- {key} -->\n'
+    if fname.exists():
+        with open(fname) as f:
+            if f.readline() == stamp:
+                return fname
+    fname.parent.mkdir(parents=True, exist_ok=True)
+    fname.write_text(stamp + make().to_html(include_plotlyjs=True))
+    return fname
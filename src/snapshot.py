@@ -0,0 +1,228 @@
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype, is_datetime64_dtype
+from sqlalchemy import select, func
+
+from src.db import get_session, get_engine
+from src.tables import TData, TFileHash, TPartition
+from src.utils import CACHE_DIR
+
+
+class Snapshot:
+    """
+    Columnar on-disk copy of the TData frame: one .npy file per column (codes and
+    categories for text columns), memory-mapped on load. The snapshot is stamped with the
+    state of the DB and only used while the stamp matches. Every snapshot is written to
+    its own directory and published by replacing meta.json, so readers in other threads
+    or processes never see a partly written snapshot.
+
+    Closed years (see TPartition) are kept in segments of their own, which are written
+    once when the year is closed. Only the rows of the open years are rewritten after
+    an update and a read only loads the segments overlapping its date range.
+    """
+
+    DIR: Path = CACHE_DIR / 'snapshot'
+    META = 'meta.json'
+
+    @staticmethod
+    def stamp() -> str:
+        """ Version of the DB: its path, number and max id of the rows, file hashes and
+        closed years."""
+        with get_session() as s:
+            n, max_id = s.execute(select(func.count(), func.max(TData.id))).one()
+            hashes = s.execute(select(TFileHash.fname, TFileHash.hash)
+                               .order_by(TFileHash.fname)).all()
+            years = TPartition.years(s)
+        db = Path(get_engine().url.database or '').resolve()
+        state = (str(db), n, max_id, hashes, years)
+        return hashlib.sha256(repr(state).encode()).hexdigest()
+
+    @classmethod
+    def meta(cls) -> dict | None:
+        fname = cls.DIR / cls.META
+        meta = json.loads(fname.read_text()) if fname.exists() else {}
+        return meta if 'dir' in meta else None
+
+    @classmethod
+    def is_valid(cls, stamp: str = None) -> bool:
+        meta = cls.meta()
+        return meta is not None and meta['stamp'] == (stamp or cls.stamp())
+
+    @classmethod
+    def year_dir(cls, year: int) -> Path:
+        return cls.DIR / f'year_{year}'
+
+    @classmethod
+    def has_year(cls, year: int) -> bool:
+        return (cls.year_dir(year) / 'columns.json').exists()
+
+    @classmethod
+    def write_year(cls, year: int, df: pd.DataFrame):
+        """ Write the segment of a closed year (the rows of the year indexed by id)."""
+        d = cls.year_dir(year)
+        shutil.rmtree(d, ignore_errors=True)
+        d.mkdir(parents=True)
+        (d / 'columns.json').write_text(json.dumps(cls.write_dir(d, df)))  # complete
+
+    @classmethod
+    def write(cls, df: pd.DataFrame | Iterable[pd.DataFrame], stamp: str = None,
+              years: list[int] = (), n: int = None):
+        """ Write the rows of the open years (indexed by id) with the given or the
+        current stamp. :param df: the rows or chunks of `n` rows in total (see
+        write_dir) :param years: closed years, written with `write_year` """
+        stamp = stamp or cls.stamp()
+        d = cls.DIR / stamp[:16]
+        d.mkdir(parents=True, exist_ok=True)
+        meta = {'stamp': stamp, 'dir': d.name, 'columns': cls.write_dir(d, df, n),
+                'years': list(years)}
+        tmp = cls.DIR / f'{cls.META}.{d.name}'
+        tmp.write_text(json.dumps(meta))
+        tmp.replace(cls.DIR / cls.META)
+        keep = {d} | {cls.year_dir(y) for y in years}
+        for old in cls.DIR.iterdir():  # open memory maps stay valid after the unlink
+            if old.is_dir() and old not in keep:
+                shutil.rmtree(old, ignore_errors=True)
+            elif old.is_file() and not old.name.startswith(cls.META):  # old layout
+                old.unlink(missing_ok=True)
+
+    @staticmethod
+    def write_dir(d: Path, df: pd.DataFrame | Iterable[pd.DataFrame],
+                  n: int = None) -> dict:
+        """ Write the index and columns of `df` into `d`. `df` may also be an iterable of
+        chunks with `n` rows in total (at least one chunk), of which only one is held in
+        memory. :returns: the column kinds """
+        if isinstance(df, pd.DataFrame):
+            df, n = [df], len(df)
+        writer = SegmentWriter(d, n)
+        for chunk in df:
+            writer.add(chunk)
+        return writer.close()
+
+    @staticmethod
+    def column(d: Path, col: str, kind: str, rows=None, text_dtype=None):
+        x = np.load(d / f'{col}.npy', mmap_mode='r')
+        x = x if rows is None else x[rows]
+        if kind in ['category', 'text']:
+            cats = json.loads((d / f'{col}.json').read_text())
+            x = pd.Categorical.from_codes(x, cats)
+            return x if kind == 'category' else x.astype(text_dtype or x.categories.dtype)
+        return x
+
+    @classmethod
+    def read(cls, columns: list[str] = None, start=None, end=None,
+             text_dtype=None) -> pd.DataFrame | None:
+        """ Read the given columns of the rows with start <= date < end.
+        :returns: None if there is no valid snapshot """
+        meta = cls.meta()
+        if meta is None or meta['stamp'] != cls.stamp():
+            return None
+        start, end = (None if t is None else pd.Timestamp(t) for t in (start, end))
+        closed = meta.get('years', [])
+        years = [y for y in closed if (start is None or start.year <= y)
+                 and (end is None or pd.Timestamp(y, 1, 1) < end)]
+        open_start = pd.Timestamp(max(closed) + 1, 1, 1) if closed else None
+        try:
+            dfs = [cls.read_dir(cls.year_dir(y), cls.kinds(y), columns, start, end,
+                                text_dtype) for y in years]
+            if not dfs or end is None or open_start is None or end > open_start:
+                dfs.append(cls.read_dir(cls.DIR / meta['dir'], meta['columns'], columns,
+                                        start, end, text_dtype))
+        except FileNotFoundError:  # replaced by a newer snapshot in the meantime
+            return None
+        return cls.union(dfs, meta['columns'])
+
+    @classmethod
+    def kinds(cls, year: int) -> dict:
+        return json.loads((cls.year_dir(year) / 'columns.json').read_text())
+
+    @staticmethod
+    def union(dfs: list[pd.DataFrame], kinds: dict) -> pd.DataFrame:
+        """ Concatenate the segments in the order of the ids."""
+        if len(dfs) == 1:
+            return dfs[0]
+        df = pd.concat(dfs).sort_index()
+        # categoricals with different categories are concatenated as objects
+        return df.astype({c: 'category' for c in df if kinds.get(c) == 'category'})
+
+    @classmethod
+    def read_dir(cls, d: Path, kinds: dict, columns=None, start=None, end=None,
+                 text_dtype=None) -> pd.DataFrame:
+        rows = None
+        if start is not None or end is not None:
+            date = np.load(d / 'date.npy', mmap_mode='r')
+            rows = np.ones(date.size, bool)
+            if start is not None:
+                rows &= date >= np.datetime64(pd.Timestamp(start))
+            if end is not None:
+                rows &= date < np.datetime64(pd.Timestamp(end))
+        columns = [c for c in kinds if c != 'id'] if columns is None else columns
+        data = {col: cls.column(d, col, kinds[col], rows, text_dtype) for col in columns}
+        index = pd.Index(cls.column(d, 'id', kinds['id'], rows), name='id')
+        return pd.DataFrame(data, index=index, columns=columns, copy=False)
+
+
+class SegmentWriter:
+    """
+    Writes the index and columns of a frame of `n` rows chunk by chunk into a snapshot
+    directory: numbers and dates into .npy files memory-mapped for writing, other
+    columns as codes of the categories of their chunk, which are mapped to the sorted
+    categories of all chunks when closing (as for astype('category')).
+    """
+
+    def __init__(self, d: Path, n: int):
+        self.d, self.n, self.pos = d, n, 0
+        self.kinds, self.arrays = {}, {}
+        self.cats = {}  # col -> categories of every chunk
+        self.chunks = []  # rows of every chunk
+
+    def open(self, col: str, x: pd.Series):
+        if is_numeric_dtype(x) or is_datetime64_dtype(x):
+            self.kinds[col], dtype = str(x.dtype), x.to_numpy().dtype
+        else:
+            is_cat = isinstance(x.dtype, pd.CategoricalDtype)
+            self.kinds[col], dtype = 'category' if is_cat else 'text', np.int32
+            self.cats[col] = []
+        self.arrays[col] = np.lib.format.open_memmap(self.d / f'{col}.npy', 'w+', dtype,
+                                                     (self.n,))
+
+    def add(self, df: pd.DataFrame):
+        rows = slice(self.pos, self.pos + len(df))
+        if rows.stop > self.n:
+            raise ValueError(f'more than {self.n} rows written to {self.d}')
+        for col, x in [('id', df.index.to_series()), *df.items()]:
+            if col not in self.kinds:
+                self.open(col, x)
+            if col in self.cats:
+                x = x.astype('category')
+                self.cats[col].append(x.cat.categories)
+                x = x.cat.codes
+            self.arrays[col][rows] = x.to_numpy()
+        self.chunks.append(rows)
+        self.pos = rows.stop
+
+    def close(self) -> dict:
+        """ Map the codes to the categories of all chunks and flush the files.
+        :returns: the column kinds """
+        if self.pos != self.n:
+            raise ValueError(f'{self.pos} of {self.n} rows written to {self.d}')
+        for col, cats in self.cats.items():
+            if len(cats) == 1:  # already the sorted categories
+                values = cats[0]
+            else:
+                codes, values = pd.factorize(cats[0].append(cats[1:]), sort=True)
+                codes = np.append(codes, -1)  # for the missing values
+                offsets = np.cumsum([0] + [len(c) for c in cats])
+                x = self.arrays[col]
+                for rows, offset in zip(self.chunks, offsets):
+                    local = x[rows]
+                    x[rows] = codes[np.where(local >= 0, offset + local, -1)]
+            (self.d / f'{col}.json').write_text(json.dumps(list(values)))
+        for x in self.arrays.values():
+            x.flush()
+        return self.kinds
@@ -1,11 +1,14 @@
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
-import numpy as np
 from sqlalchemy import (Column, Integer, String, ForeignKey, DateTime, func, Engine,
-                        Numeric, UniqueConstraint, select, tuple_)
+                        Numeric, UniqueConstraint, select, tuple_, Float, Index, cast,
+                        insert, delete, exists, Table, MetaData, Select, or_, and_)
 from sqlalchemy.orm import declarative_base, relationship, Session
 from src.logger import setup_logger
+from src.perf import timed
 from src.utils import DATA_DIR
 
 Base = declarative_base()
@@ -24,7 +27,10 @@ class MyBase(Base):
 
     SORT_BY = [0]
     EXCLUDE_COLS = []
-    LOG = setup_logger(__name__)
+
+    @classproperty
+    def LOG(self):  # noqa, set up on first use
+        return setup_logger(__name__)
 
     @classproperty
     def name_(self):
@@ -39,52 +45,53 @@ class MyBase(Base):
         return [c.name for c in self.columns_]
 
     @classmethod
-    def delete(cls, s: Session, *clause):
-        objs = s.query(cls).filter(*clause).all()
-        for o in objs:
-            s.delete(o)
-        if len(objs) > 0:
-            cls.LOG.info(f'Removed {len(objs)} rows from {cls.name_}.')
-
-    @classmethod
-    def insert(cls, s: Session, objs: list['MyBase']) -> int:
-        s.bulk_save_objects(objs)
-        if len(objs) > 0:
-            cls.LOG.info(f'Inserted {len(objs)} rows into {cls.name_}.')
-        return len(objs)
+    def delete(cls, s: Session, *clause) -> int:
+        n = s.execute(delete(cls).where(*clause)).rowcount
+        if n > 0:
+            cls.LOG.info('Removed %d rows from %s.', n, cls.name_)
+        return n
 
     @classmethod
     def drop(cls, engine: Engine):
         cls.__table__.drop(engine)
 
-    @classmethod
-    def existing(cls, s: Session) -> set:
-        data = set(s.execute(select(*cls.columns_)).all())
-        return {t[0] for t in data} if len(cls.columns_) == 1 else data
-
     @classmethod
     def read_file(cls, data: dict, s: Session) -> set:
         """ Read the data from file into a set"""
         return set(data)
 
     @classmethod
-    def write(cls, s: Session, data: dict) -> int:
-        """ Insert the data into the DB"""
-
-        existing = cls.existing(s)
-        from_file = cls.read_file(data, s)
-
-        # remove categories not in file data
-        to_remove = existing - from_file
-        cols = cls.columns_
-        cls.delete(s, tuple_(*cols).in_(to_remove))
+    def staging(cls) -> Table:
+        """ Temporary table with the columns compared by `write`, indexed for the
+        anti-join."""
+        name = f'staging_{cls.__tablename__}'
+        return Table(name, MetaData(), *[Column(c.name, c.type) for c in cls.columns_],
+                     Index(f'ix_{name}', *cls.column_names), prefixes=['TEMPORARY'])
 
-        # Add new categories
-        to_add = np.array(sorted(from_file - existing,
-                          key=lambda x: tuple(x[i] for i in cls.SORT_BY)))
-        to_add = to_add.reshape(-1, len(cols))  # ensure 2D array
-        return cls.insert(s, [cls(**{c.name: val for c, val in zip(cols, vals)})
-                              for vals in to_add])
+    @classmethod
+    def write(cls, s: Session, data: dict) -> int:
+        """ Sync the table with the data of the file. The rows of the file are staged in
+        a temporary table, stored rows missing there are deleted (anti-join) and new ones
+        (EXCEPT the stored ones) inserted in the order of SORT_BY, one statement each.
+        :returns: number of inserted rows"""
+        cols, names = cls.columns_, cls.column_names
+        rows = [r if len(cols) > 1 else (r,) for r in cls.read_file(data, s)]
+        t, staging = cls.__table__, cls.staging()
+        con = s.connection()
+        staging.create(con)
+        try:
+            if rows:
+                con.execute(staging.insert(), [dict(zip(names, r)) for r in rows])
+            in_file = select(staging).where(*[staging.c[c.name] == c for c in cols])
+            cls.delete(s, ~in_file.exists())
+            new = select(staging).except_(select(*cols)).subquery()
+            q = select(new).order_by(*[new.c[names[i]] for i in cls.SORT_BY])
+            n = con.execute(insert(t).from_select(names, q)).rowcount
+        finally:
+            staging.drop(con)
+        if n > 0:
+            cls.LOG.info('Inserted %d rows into %s.', n, cls.name_)
+        return n
 
 
 class TData(MyBase):
@@ -101,12 +108,123 @@ class TData(MyBase):
     category = Column(String)
     sub_category = Column(String)
 
+    # the unique index also serves date ranges, since date is its first column
     __table_args__ = (UniqueConstraint('date', 'title', 'amount', 'balance',
-                                       name='uix_date_tit_am_bal'),)
+                                       name='uix_date_tit_am_bal'),
+                      Index('ix_data_category', 'category', 'sub_category'),
+                      Index('ix_data_vendor', 'vendor'),
+                      Index('ix_data_account', 'account'))
 
     TYPE_ORDER = ['title', 'vendor', 'account']
 
 
+class TMonthly(MyBase):
+    """ Sum and number of the amounts in TData per month and (sub-)category."""
+    __tablename__ = 'monthly'
+    EXCLUDE_COLS = ['id']
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    category = Column(String)
+    sub_category = Column(String)
+    amount = Column(Float, nullable=False)
+    n = Column(Integer, nullable=False)
+
+    __table_args__ = (Index('ix_monthly_year_month', 'year', 'month'),)
+
+    @classmethod
+    def sums(cls) -> Select:
+        """ Query of the monthly sums of TData (filter it with where on TData)."""
+        period = func.strftime('%Y-%m', TData.date)
+        q = select(cast(func.strftime('%Y', TData.date), Integer).label('year'),
+                   cast(func.strftime('%m', TData.date), Integer).label('month'),
+                   TData.category, TData.sub_category,
+                   cast(func.sum(TData.amount), Float).label('amount'),
+                   func.count().label('n'))
+        return q.group_by(period, TData.category, TData.sub_category)
+
+    @classmethod
+    def refresh(cls, s: Session, months=None):
+        """ Recompute the given months (periods or dates; default: all) from TData."""
+        q_del, q = delete(cls), cls.sums()
+        if months is not None:
+            months = {(m.year, m.month) for m in months}
+            if len(months) == 0:
+                return
+            q_del = q_del.where(tuple_(cls.year, cls.month).in_(months))
+            # date ranges, not strftime(date), so that the rows are searched by the index
+            q = q.where(or_(*[and_(TData.date >= start, TData.date < end)
+                              for start, end in cls.ranges(months)]))
+        s.execute(q_del)
+        cols = ['year', 'month', 'category', 'sub_category', 'amount', 'n']
+        s.execute(insert(cls).from_select(cols, q))
+
+    @staticmethod
+    def ranges(months: set[tuple[int, int]]) -> list[tuple[datetime, datetime]]:
+        """ Consecutive (year, month) pairs merged into [first day, first day after)."""
+        res = []
+        for i in sorted(12 * y + m - 1 for y, m in months):
+            start = datetime(i // 12, i % 12 + 1, 1)
+            end = datetime((i + 1) // 12, (i + 1) % 12 + 1, 1)
+            if res and res[-1][1] == start:
+                res[-1] = (res[-1][0], end)
+            else:
+                res.append((start, end))
+        return res
+
+    @classmethod
+    def ensure(cls, s: Session):
+        """ Build the table if it is empty but TData is not (e.g. for an existing DB)."""
+        if not s.scalar(select(exists().select_from(cls))) and \
+                s.scalar(select(exists().select_from(TData))):
+            cls.refresh(s)
+
+
+class TPartition(MyBase):
+    """ Closed years with their precomputed totals. The rows of closed years are
+    read-only: they are neither ingested nor recategorised and snapshotted only once.
+    Years are closed from the oldest one on, so all years before `open_start` are
+    closed."""
+    __tablename__ = 'partitions'
+
+    year = Column(Integer, primary_key=True)
+    n = Column(Integer, nullable=False)
+    amount = Column(Float, nullable=False)
+    time_stamp = Column(DateTime, default=func.now())
+
+    @classmethod
+    def years(cls, s: Session) -> list[int]:
+        return list(s.scalars(select(cls.year).order_by(cls.year)))
+
+    @classmethod
+    def open_start(cls, s: Session) -> datetime | None:
+        """ Start of the first open year (None if no year is closed)."""
+        last = s.scalar(select(func.max(cls.year)))
+        return None if last is None else datetime(last + 1, 1, 1)
+
+    @classmethod
+    def close(cls, s: Session, until: int) -> list[int]:
+        """ Close the open years up to `until` which have rows.
+        :returns: the closed years """
+        year = cast(func.strftime('%Y', TData.date), Integer)
+        q = select(year, func.count(), cast(func.sum(TData.amount), Float)).where(
+            TData.date < datetime(until + 1, 1, 1))
+        if (start := cls.open_start(s)) is not None:
+            q = q.where(TData.date >= start)
+        rows = s.execute(q.group_by(year).order_by(year)).all()
+        if rows:
+            s.execute(insert(cls), [dict(year=y, n=n, amount=a) for y, n, a in rows])
+        return [y for y, _, _ in rows]
+
+    @classmethod
+    def reopen(cls, s: Session, year: int) -> list[int]:
+        """ Reopen `year` and all later years. :returns: the reopened years """
+        years = [y for y in cls.years(s) if y >= year]
+        s.execute(delete(cls).where(cls.year >= year))
+        return years
+
+
 class TMeta(MyBase):
     __tablename__ = 'meta'
     EXCLUDE_COLS = ['id']
@@ -146,7 +264,7 @@ class TSubCategory(MyBase):
 
     @classmethod
     def read_file(cls, data: dict, s: Session) -> set:
-        cat = {i.name: i.id for i in s.scalars(select(TCategory)).all()}
+        cat = dict(s.execute(select(TCategory.name, TCategory.id)).all())
         return set((sc, cat[n]) for n, subs in data.items() for sc in subs)
 
 
@@ -165,8 +283,8 @@ class TTag(MyBase):
 
     @classmethod
     def read_file(cls, data: dict, s: Session) -> set:
-        subcat = {sc.name: sc.id for sc in s.scalars(select(TSubCategory)).all()}
-        meta = {m.tag_type: m.id for m in s.scalars(select(TMeta)).all()}
+        subcat = dict(s.execute(select(TSubCategory.name, TSubCategory.id)).all())
+        meta = dict(s.execute(select(TMeta.tag_type, TMeta.id)).all())
         return {(tag.lower(), subcat[sc], meta[m])
                 for subs in data.values() for sc, td in subs.items()
                 for m, tags in td.items() for tag in tags}
@@ -178,20 +296,61 @@ class TFileHash(MyBase):
     fname = Column(String, primary_key=True)  # file path or identifier
     hash = Column(String, nullable=False)  # SHA256 hex digest
     time_stamp = Column(DateTime, default=func.now(), onupdate=func.now())
+    mtime = Column(Integer)  # modification time [ns] when the hash was computed
+    size = Column(Integer)  # file size [B] when the hash was computed
+
+    CHUNK_SIZE = 1 << 20  # bytes read at once
+    HASHES = {}  # memoized hashes by (path, mtime, size)
 
     @staticmethod
-    def compute(path: Path) -> str:
-        """Compute SHA256 hash of a file."""
-        m = hashlib.sha256()
-        m.update(path.read_bytes())
-        return m.hexdigest()
+    def stat(path: Path) -> tuple[int, int]:
+        st = path.stat()
+        return st.st_mtime_ns, st.st_size
+
+    @classmethod
+    @timed(rows=lambda _: None)
+    def compute(cls, path: Path) -> str:
+        """Compute SHA256 hash of a file, streamed in chunks and memoized by its stat."""
+        key = (str(path), *cls.stat(path))
+        if key not in cls.HASHES:
+            m = hashlib.sha256()
+            with open(path, 'rb') as f:
+                while chunk := f.read(cls.CHUNK_SIZE):
+                    m.update(chunk)
+            cls.HASHES[key] = m.hexdigest()
+        return cls.HASHES[key]
+
+    def unchanged(self, path: Path) -> bool:
+        """ Fast check without reading the file: same modification time and size."""
+        return (self.mtime, self.size) == self.stat(path)
 
     @classmethod
     def has_update(cls, session, file_path: Path) -> bool:
         """Return True if file is new/changed, False if unchanged."""
-        new_hash = cls.compute(file_path)
-        record = session.get(cls, str(file_path))
-        return record is None or record.hash != new_hash
+        return cls.has_updates(session, [file_path])[0]
+
+    @classmethod
+    def has_updates(cls, session, paths: list[Path], jobs: int = None) -> list[bool]:
+        """
+        Check which files are new/changed. Files with the stored modification time and
+        size are skipped without being read, the others are hashed in a thread pool.
+        :returns: list with True for every new/changed file
+        """
+        records = [session.get(cls, str(p)) for p in paths]
+        todo = [i for i, (r, p) in enumerate(zip(records, paths))
+                if r is None or not r.unchanged(p)]
+        hashes = {}
+        if todo:
+            with ThreadPoolExecutor(jobs) as ex:
+                hashes = dict(zip(todo, ex.map(cls.compute, [paths[i] for i in todo])))
+        updates = [False] * len(paths)
+        for i, hash_ in hashes.items():
+            r = records[i]
+            if r is None or r.hash != hash_:
+                updates[i] = True
+            else:  # touched but same content -> skip the hashing next time
+                r.mtime, r.size = cls.stat(paths[i])
+        return updates
 
     @classmethod
     def write(cls, s: Session, path: Path):
@@ -202,6 +361,7 @@ class TFileHash(MyBase):
             s.add(record)
         else:
             record.hash = hash_
+        record.mtime, record.size = cls.stat(path)
 
     @classmethod
     def clean(cls, session, data_dir: Path = None):
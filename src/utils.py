@@ -2,6 +2,7 @@ from pathlib import Path
 
 TOP_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = TOP_DIR / 'data'
+CACHE_DIR = TOP_DIR / '.cache'
 
 
 def bytes2str(n: int) -> str:
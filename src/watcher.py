@@ -0,0 +1,110 @@
+import threading
+from pathlib import Path
+from typing import Callable
+
+from src.categories import Categories
+from src.data import Data
+from src.logger import setup_logger
+from src.tables import TFileHash
+
+
+class Watcher:
+    """
+    Ingests new or changed bank exports and categories in the background.
+
+    A daemon thread polls the modification time and size of the hist*.csv files and of
+    the categories file every `interval` seconds. If one of them changed, it runs the
+    update of `Data` (ingest, recategorisation, summary table and snapshot) in its own
+    DB session. After every update which changed the DB the version is incremented and
+    the subscribers are called with it on the watcher thread.
+    """
+
+    def __init__(self, interval: float = 5., chunksize: int = None, jobs=1):
+        self.interval = interval
+        self.kwargs = dict(chunksize=chunksize, jobs=jobs)
+        self.version = 0  # incremented after every ingest which changed the DB
+        self.error = None  # last exception of the update
+        self.subscribers: list[Callable[[int], None]] = []
+        self.stats_ = None  # (mtime, size) of the watched files at the last update
+        self.stop_ = threading.Event()
+        self.changed = threading.Condition()
+        self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def log(self):
+        return setup_logger(__name__)
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    @staticmethod
+    def fnames() -> list[Path]:
+        return [*Data.DIR.glob('hist*.csv'), Categories.FNAME]
+
+    def stats(self) -> dict:
+        return {f: TFileHash.stat(f) for f in self.fnames() if f.exists()}
+
+    def poll(self) -> bool:
+        """ Update the DB if a watched file changed since the last poll.
+        :returns: whether the DB changed """
+        stats = self.stats()
+        if stats == self.stats_:
+            return False
+        data = Data(columns=[], **self.kwargs)
+        self.stats_ = stats
+        if data.version == 0:  # e.g. only touched files
+            return False
+        version = self.version + 1
+        for callback in list(self.subscribers):  # refreshed before the waiters wake up
+            callback(version)
+        with self.changed:
+            self.version = version
+            self.changed.notify_all()
+        self.log.info('published data version %d', version)
+        return True
+
+    def run(self):
+        while not self.stop_.is_set():
+            try:
+                self.poll()
+                self.error = None
+            except Exception as err:  # keep watching, retried at the next poll
+                self.error = err
+                self.log.exception('background update failed: %s', err)
+            self.stop_.wait(self.interval)
+
+    def start(self) -> 'Watcher':
+        if not self.running:
+            self.stop_.clear()
+            self.thread = threading.Thread(target=self.run, name='expenses-watcher',
+                                           daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        """ Stop polling; waits for a running update to finish."""
+        self.stop_.set()
+        if self.running:
+            self.thread.join(timeout)
+
+    def subscribe(self, callback: Callable[[int], None]) -> Callable[[int], None]:
+        """ Call `callback(version)` after every update which changed the DB."""
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback: Callable[[int], None]):
+        self.subscribers.remove(callback)
+
+    def wait(self, version: int = None, timeout: float = None) -> bool:
+        """ Block until the version is larger than `version` (default: the current).
+        :returns: False on timeout """
+        version = self.version if version is None else version
+        with self.changed:
+            return self.changed.wait_for(lambda: self.version > version, timeout)